@@ -0,0 +1,174 @@
+import sys
+import os
+import argparse
+import json
+import math
+import platform
+import random
+import tempfile
+import time
+import numpy as np
+import main as converter
+from claude import Pipeline, find_bounding_box, normalize_polylines
+
+SVG_HEADER = '<svg xmlns="http://www.w3.org/2000/svg" width="1000" height="1000" viewBox="0 0 1000 1000">\n'
+SVG_FOOTER = '</svg>\n'
+
+# Synthetic drawing generators; each returns the SVG body for a given scale
+
+def short_paths(rng, scale):
+    # Thousands of tiny two or three segment strokes, like traced handwriting
+    shapes = []
+    for _ in range(1000 * scale):
+        x, y = rng.uniform(0, 990), rng.uniform(0, 990)
+        shapes.append(f'<path d="M{x:.2f},{y:.2f} l{rng.uniform(-5, 5):.2f},{rng.uniform(-5, 5):.2f} '
+                      f'l{rng.uniform(-5, 5):.2f},{rng.uniform(-5, 5):.2f}"/>')
+    return '\n'.join(shapes)
+
+def huge_cubics(rng, scale):
+    # A few long paths made of many cubic Bezier segments
+    shapes = []
+    for _ in range(3):
+        d = [f'M{rng.uniform(0, 100):.2f},{rng.uniform(0, 1000):.2f}']
+        for _ in range(20 * scale):
+            d.append(' '.join(f'{rng.uniform(0, 1000):.2f},{rng.uniform(0, 1000):.2f}' for _ in range(3)))
+        shapes.append(f'<path d="{d[0]} C{" ".join(d[1:])}"/>')
+    return '\n'.join(shapes)
+
+def arcs_and_circles(rng, scale):
+    shapes = []
+    for _ in range(50 * scale):
+        cx, cy, r = rng.uniform(50, 950), rng.uniform(50, 950), rng.uniform(5, 50)
+        shapes.append(f'<circle cx="{cx:.2f}" cy="{cy:.2f}" r="{r:.2f}"/>')
+        shapes.append(f'<ellipse cx="{cy:.2f}" cy="{cx:.2f}" rx="{r:.2f}" ry="{r / 2:.2f}"/>')
+        shapes.append(f'<path d="M{cx:.2f},{cy:.2f} A{r:.2f},{r * 1.5:.2f} 30 1 1 {cx + r:.2f},{cy + r:.2f}"/>')
+    return '\n'.join(shapes)
+
+def dense_polylines(rng, scale):
+    # Long polylines with a point every unit, like an exported waveform
+    shapes = []
+    for row in range(10):
+        points = ' '.join(f'{x},{row * 100 + 50 + 40 * math.sin(x / 15) + rng.uniform(-2, 2):.2f}'
+                          for x in range(0, 1000 * scale, max(1, scale // 2)))
+        shapes.append(f'<polyline points="{points}"/>')
+    return '\n'.join(shapes)
+
+GENERATORS = {
+    'short_paths': short_paths,
+    'huge_cubics': huge_cubics,
+    'arcs_and_circles': arcs_and_circles,
+    'dense_polylines': dense_polylines,
+}
+
+def generate(name, directory, scale, seed=0):
+    path = os.path.join(directory, f'{name}.svg')
+    with open(path, 'w') as f:
+        f.write(SVG_HEADER)
+        f.write(GENERATORS[name](random.Random(seed), scale))
+        f.write(SVG_FOOTER)
+    return path
+
+def run_stages(svg_file, args):
+    """Run the converter one stage at a time, returning timings in seconds and some size figures"""
+    timings = {}
+    pipeline = Pipeline(args.precision, args.flatten, args.tolerance)
+
+    started = time.perf_counter()
+    paths, _, _ = pipeline.extract(svg_file)
+    timings['extract'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    polylines = pipeline.sample(paths)
+    timings['sample'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    normalized = normalize_polylines(polylines, find_bounding_box(polylines))
+    timings['normalize'] = time.perf_counter() - started
+
+    # Splitting is timed together with the conversion to SVP coordinates, writing on its own
+    started = time.perf_counter()
+    controls = list(converter.pitch_controls(normalized, args, args.x))
+    timings['split'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with tempfile.NamedTemporaryFile(suffix='.svp', delete=False) as f:
+        output_file = f.name
+    try:
+        converter.write_svp(output_file, [(None, controls)], args)
+        timings['write'] = time.perf_counter() - started
+        output_bytes = os.path.getsize(output_file)
+    finally:
+        os.unlink(output_file)
+
+    counts = {
+        'paths': len(paths),
+        'points': sum(len(polyline) for polyline in polylines),
+        'controls': len(controls),
+        'control_points': sum(len(points) // 2 for _, _, points in controls),
+        'bytes': output_bytes,
+    }
+    return timings, counts
+
+def conversion_args(precision):
+    parser = argparse.ArgumentParser(add_help=False)
+    converter.add_conversion_arguments(parser)
+    args = parser.parse_args([])
+    args.precision = precision
+    return args
+
+def compare(previous_file, report):
+    """Print the time ratio of every case against a previous report"""
+    with open(previous_file) as f:
+        previous = {(r['case'], r['precision']): r for r in json.load(f)['results']}
+    for result in report['results']:
+        old = previous.get((result['case'], result['precision']))
+        if old is None:
+            continue
+        ratios = ', '.join(f"{stage} {result['timings'][stage] / old['timings'][stage]:.2f}x"
+                           for stage in result['timings'] if old['timings'].get(stage))
+        print(f"{result['case']:<18} p={result['precision']:<6} {ratios}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every stage of the SVG to SVP converter on synthetic drawings')
+    parser.add_argument('--cases', nargs='+', choices=list(GENERATORS), default=list(GENERATORS), help='Drawings to generate')
+    parser.add_argument('--precision', '-p', nargs='+', type=float, default=[0.25, 1.0, 4.0], help='Precision values to sweep')
+    parser.add_argument('--scale', type=int, default=1, help='Size multiplier for the synthetic drawings')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement; the fastest one is kept')
+    parser.add_argument('--output', '-o', default='bench_output.json', help='JSON report file (default: bench_output.json)')
+    parser.add_argument('--compare', help='Previous JSON report to print time ratios against')
+    args = parser.parse_args()
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'scale': args.scale,
+            'repeat': args.repeat,
+        },
+        'results': [],
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        for case in args.cases:
+            svg_file = generate(case, directory, args.scale)
+            for precision in args.precision:
+                runs = [run_stages(svg_file, conversion_args(precision)) for _ in range(args.repeat)]
+                timings = {stage: min(run[0][stage] for run in runs) for stage in runs[0][0]}
+                result = {'case': case, 'precision': precision, 'svg_bytes': os.path.getsize(svg_file),
+                          'timings': timings, 'total': sum(timings.values()), **runs[0][1]}
+                report['results'].append(result)
+                stages = ' '.join(f'{stage}={seconds * 1000:.1f}ms' for stage, seconds in timings.items())
+                print(f"{case:<18} p={precision:<6} points={result['points']:<8} controls={result['controls']:<6} {stages}")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        compare(args.compare, report)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
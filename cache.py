@@ -0,0 +1,88 @@
+import os
+import hashlib
+import json
+import tempfile
+import numpy as np
+from claude import PolylineSet, as_polyline_set
+
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'svg2pitch')
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024 # Bytes
+
+class PolylineCache:
+    """Content-addressed on-disk cache of normalized polylines, one .npz per SVG and sampler settings
+
+    Entries are evicted least recently used first once the directory grows past max_bytes.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, svg_file, settings):
+        """Hash the SVG's bytes together with everything that affects sampling"""
+        digest = hashlib.sha256()
+        with open(svg_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        digest.update(json.dumps(settings, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def load(self, key):
+        """Return (polylines, bounding_box, width, height) for a key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                points, offsets = data['points'], data['offsets']
+                bounding_box = tuple(data['bounding_box'].tolist())
+                width, height = data['size'].tolist()
+        except (OSError, KeyError, ValueError):
+            return None
+
+        # Mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return PolylineSet(points, offsets), bounding_box, width, height
+
+    def store(self, key, polylines, bounding_box, width, height):
+        os.makedirs(self.directory, exist_ok=True)
+        polylines = as_polyline_set(polylines)
+
+        # Write to a temporary file first so concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, points=polylines.points, offsets=polylines.offsets, bounding_box=np.array(bounding_box, dtype=float),
+                         size=np.array([width, height], dtype=float))
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Delete the least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npz'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
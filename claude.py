@@ -2,215 +2,828 @@
 # With my own modifications
 
 import xml.etree.ElementTree as ET
-import re
 import argparse
 import traceback
 import math
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
 import numpy as np
-from svg.path import parse_path, Line, CubicBezier, QuadraticBezier, Arc
-from svg.path.path import Move
+from svg.path import Path, Line, CubicBezier, QuadraticBezier, Arc
+from svg.path.path import Move, Close, Linear
+from pathdata import PathArrays, parse_path_data, parse_points, MOVE, IS_CURVED
 
-def extract_paths_from_svg(svg_file):
-    """Extract path data from SVG file"""
-    
-    # Register SVG namespace
-    ET.register_namespace("", "http://www.w3.org/2000/svg")
-    namespaces = {'svg': 'http://www.w3.org/2000/svg'}
-    
-    # Parse the SVG file
-    tree = ET.parse(svg_file)
-    root = tree.getroot()
-    
-    # Get the width and height of the SVG
+# Sampling strategies understood by path_to_polyline
+FLATTEN_MODES = ('uniform', 'arclength', 'adaptive')
+# Units of a clip window: fractions of the drawing's bounding box with Y growing upwards, like the normalized polylines,
+# or plain SVG user units
+CLIP_UNITS = ('normalized', 'svg')
+DEFAULT_TOLERANCE = 0.1 # Maximum chord deviation in SVG units for adaptive flattening
+MAX_SUBDIVISION_DEPTH = 16
+
+# Gauss-Legendre nodes and weights mapped to [0, 1], for arc lengths of cubic Beziers and elliptical arcs
+GAUSS_ORDER = 16
+GAUSS_NODES, GAUSS_WEIGHTS = np.polynomial.legendre.leggauss(GAUSS_ORDER)
+GAUSS_NODES, GAUSS_WEIGHTS = (GAUSS_NODES + 1) / 2, GAUSS_WEIGHTS / 2
+LENGTH_TOLERANCE = 1e-10 # Relative error bound for quadrature lengths
+MAX_LENGTH_PANELS = 1024
+ARC_LENGTH_NEWTON_STEPS = 3
+
+# Bump whenever a change alters the sampled points, so cached polylines from older versions are not reused
+SAMPLER_VERSION = 4
+
+SVG_NS = '{http://www.w3.org/2000/svg}'
+
+def _svg_size(attrib):
+    """Get the width and height of the SVG from the root element's attributes"""
     try:
-        width = float(root.attrib.get('width', '100').replace('px', ''))
-        height = float(root.attrib.get('height', '100').replace('px', ''))
+        width = float(attrib.get('width', '100').replace('px', ''))
+        height = float(attrib.get('height', '100').replace('px', ''))
     except ValueError:
         width, height = 100, 100  # Default values if parsing fails
         
     # Check for viewBox attribute which might override width/height
-    if 'viewBox' in root.attrib:
-        viewbox = root.attrib['viewBox'].split()
+    if 'viewBox' in attrib:
+        viewbox = attrib['viewBox'].split()
         if len(viewbox) == 4:
             min_x, min_y, vb_width, vb_height = map(float, viewbox)
             width, height = vb_width, vb_height
     
-    paths = []
+    return width, height
+
+def _points_to_path(points, closed):
+    """Build a Path of straight lines through the given points"""
+    segments = [Move(points[0])]
+    for start, end in zip(points, points[1:]):
+        segments.append(Line(start, end))
+    if closed:
+        segments.append(Close(points[-1], points[0]))
+    return Path(*segments)
+
+def _ellipse_to_path(cx, cy, rx, ry):
+    """Build a closed Path of four quarter arcs"""
+    corners = [complex(cx + rx, cy), complex(cx, cy + ry), complex(cx - rx, cy), complex(cx, cy - ry)]
+    radius = complex(rx, ry)
+    segments = [Move(corners[0])]
+    for start, end in zip(corners, corners[1:] + corners[:1]):
+        segments.append(Arc(start, radius, 0, False, True, end))
+    segments.append(Close(corners[0], corners[0]))
+    return Path(*segments)
+
+def _rect_to_path(x, y, w, h, rx, ry):
+    """Build a closed Path for a (possibly rounded) rectangle"""
+    if rx == 0 and ry == 0:
+        # Simple rectangle
+        return _points_to_path([complex(x, y), complex(x + w, y), complex(x + w, y + h), complex(x, y + h)], True)
     
-    # Find all path elements
-    for path in root.findall('.//svg:path', namespaces):
-        if 'd' in path.attrib:
-            paths.append(path.attrib['d'])
+    # Rounded rectangle: straight edges joined by corner arcs
+    radius = complex(rx, ry)
+    points = [complex(x + rx, y), complex(x + w - rx, y), complex(x + w, y + ry), complex(x + w, y + h - ry),
+              complex(x + w - rx, y + h), complex(x + rx, y + h), complex(x, y + h - ry), complex(x, y + ry),
+              complex(x + rx, y)]
+    segments = [Move(points[0])]
+    for i in range(len(points) - 1):
+        if i % 2 == 0:
+            segments.append(Line(points[i], points[i + 1]))
+        else:
+            segments.append(Arc(points[i], radius, 0, False, True, points[i + 1]))
+    segments.append(Close(points[-1], points[0]))
+    return Path(*segments)
+
+SHAPE_TAGS = ('path', 'polyline', 'polygon', 'line', 'rect', 'circle', 'ellipse')
+
+def element_to_path(tag, attrib):
+    """Build the geometry of a single SVG shape element, or None if it isn't a usable shape"""
     
-    # Also handle polyline elements
-    for polyline in root.findall('.//svg:polyline', namespaces):
-        if 'points' in polyline.attrib:
-            points = polyline.attrib['points'].strip()
-            points = re.sub(r'\s+', ' ', points)  # Normalize whitespace
-            
-            # Convert polyline points to a path
-            point_pairs = []
-            for point in points.split():
-                if ',' in point:
-                    x, y = point.split(',')
-                    point_pairs.append((float(x), float(y)))
-                elif point_pairs:  # Assume alternating x,y values
-                    if len(point_pairs[-1]) == 2:
-                        point_pairs.append([float(point)])
-                    else:
-                        point_pairs[-1].append(float(point))
-            
-            if point_pairs:
-                path_data = f"M {point_pairs[0][0]},{point_pairs[0][1]} "
-                for x, y in point_pairs[1:]:
-                    path_data += f"L {x},{y} "
-                paths.append(path_data)
-    
-    # Handle polygon elements
-    for polygon in root.findall('.//svg:polygon', namespaces):
-        if 'points' in polygon.attrib:
-            points = polygon.attrib['points'].strip()
-            points = re.sub(r'\s+', ' ', points)  # Normalize whitespace
-            
-            # Convert polygon points to a path (closed)
-            point_pairs = []
-            for point in points.split():
-                if ',' in point:
-                    x, y = point.split(',')
-                    point_pairs.append((float(x), float(y)))
-                elif point_pairs:  # Assume alternating x,y values
-                    if len(point_pairs[-1]) == 2:
-                        point_pairs.append([float(point)])
-                    else:
-                        point_pairs[-1].append(float(point))
-            
-            if point_pairs:
-                path_data = f"M {point_pairs[0][0]},{point_pairs[0][1]} "
-                for x, y in point_pairs[1:]:
-                    path_data += f"L {x},{y} "
-                path_data += "Z"  # Close the path
-                paths.append(path_data)
-    
-    # Handle line elements
-    for line in root.findall('.//svg:line', namespaces):
-        if all(attr in line.attrib for attr in ['x1', 'y1', 'x2', 'y2']):
-            x1 = float(line.attrib['x1'])
-            y1 = float(line.attrib['y1'])
-            x2 = float(line.attrib['x2'])
-            y2 = float(line.attrib['y2'])
-            
-            path_data = f"M {x1},{y1} L {x2},{y2}"
-            paths.append(path_data)
-    
-    # Handle rect elements
-    for rect in root.findall('.//svg:rect', namespaces):
-        if all(attr in rect.attrib for attr in ['x', 'y', 'width', 'height']):
-            x = float(rect.attrib['x'])
-            y = float(rect.attrib['y'])
-            w = float(rect.attrib['width'])
-            h = float(rect.attrib['height'])
-            
+    if tag == 'path':
+        if 'd' in attrib:
+            return parse_path_data(attrib['d'])
+    
+    elif tag in ('polyline', 'polygon'):
+        if 'points' in attrib:
+            points = parse_points(attrib['points'])
+            if len(points):
+                return PathArrays.from_points(points, tag == 'polygon')
+    
+    elif tag == 'line':
+        if all(attr in attrib for attr in ['x1', 'y1', 'x2', 'y2']):
+            start = complex(float(attrib['x1']), float(attrib['y1']))
+            end = complex(float(attrib['x2']), float(attrib['y2']))
+            return Path(Move(start), Line(start, end))
+    
+    elif tag == 'rect':
+        if all(attr in attrib for attr in ['x', 'y', 'width', 'height']):
             # Optional rx, ry for rounded corners
-            rx = float(rect.attrib.get('rx', 0))
-            ry = float(rect.attrib.get('ry', rx))  # If ry is not specified, use rx
-            
-            if rx == 0 and ry == 0:
-                # Simple rectangle
-                path_data = f"M {x},{y} H {x+w} V {y+h} H {x} Z"
-            else:
-                # Rounded rectangle
-                path_data = f"M {x+rx},{y} "
-                path_data += f"H {x+w-rx} "
-                path_data += f"A {rx},{ry} 0 0 1 {x+w},{y+ry} "
-                path_data += f"V {y+h-ry} "
-                path_data += f"A {rx},{ry} 0 0 1 {x+w-rx},{y+h} "
-                path_data += f"H {x+rx} "
-                path_data += f"A {rx},{ry} 0 0 1 {x},{y+h-ry} "
-                path_data += f"V {y+ry} "
-                path_data += f"A {rx},{ry} 0 0 1 {x+rx},{y} "
-                path_data += "Z"
-            
-            paths.append(path_data)
-    
-    # Handle circle elements
-    for circle in root.findall('.//svg:circle', namespaces):
-        if all(attr in circle.attrib for attr in ['cx', 'cy', 'r']):
-            cx = float(circle.attrib['cx'])
-            cy = float(circle.attrib['cy'])
-            r = float(circle.attrib['r'])
-            
-            # Create a circle path (uses two arc commands)
-            path_data = f"M {cx+r},{cy} "
-            path_data += f"A {r},{r} 0 0 1 {cx},{cy+r} "
-            path_data += f"A {r},{r} 0 0 1 {cx-r},{cy} "
-            path_data += f"A {r},{r} 0 0 1 {cx},{cy-r} "
-            path_data += f"A {r},{r} 0 0 1 {cx+r},{cy} "
-            path_data += "Z"
-            
-            paths.append(path_data)
-    
-    # Handle ellipse elements
-    for ellipse in root.findall('.//svg:ellipse', namespaces):
-        if all(attr in ellipse.attrib for attr in ['cx', 'cy', 'rx', 'ry']):
-            cx = float(ellipse.attrib['cx'])
-            cy = float(ellipse.attrib['cy'])
-            rx = float(ellipse.attrib['rx'])
-            ry = float(ellipse.attrib['ry'])
-            
-            # Create an ellipse path (uses two arc commands)
-            path_data = f"M {cx+rx},{cy} "
-            path_data += f"A {rx},{ry} 0 0 1 {cx},{cy+ry} "
-            path_data += f"A {rx},{ry} 0 0 1 {cx-rx},{cy} "
-            path_data += f"A {rx},{ry} 0 0 1 {cx},{cy-ry} "
-            path_data += f"A {rx},{ry} 0 0 1 {cx+rx},{cy} "
-            path_data += "Z"
-            
-            paths.append(path_data)
+            rx = float(attrib.get('rx', 0))
+            ry = float(attrib.get('ry', rx))  # If ry is not specified, use rx
+            return _rect_to_path(float(attrib['x']), float(attrib['y']),
+                                 float(attrib['width']), float(attrib['height']), rx, ry)
+    
+    elif tag == 'circle':
+        if all(attr in attrib for attr in ['cx', 'cy', 'r']):
+            r = float(attrib['r'])
+            return _ellipse_to_path(float(attrib['cx']), float(attrib['cy']), r, r)
     
-    return paths, width, height
+    elif tag == 'ellipse':
+        if all(attr in attrib for attr in ['cx', 'cy', 'rx', 'ry']):
+            return _ellipse_to_path(float(attrib['cx']), float(attrib['cy']),
+                                    float(attrib['rx']), float(attrib['ry']))
+    
+    return None
+
+def _iter_elements(events, root):
+    """Yield (tag, attrib) for SVG elements from an iterparse event stream, freeing elements as we go"""
+    for event, elem in events:
+        if event != 'end':
+            continue
+        if elem.tag.startswith(SVG_NS):
+            yield elem.tag[len(SVG_NS):], elem.attrib
+        # Drop what we've already consumed so memory stays flat regardless of file size
+        elem.clear()
+        root.clear()
+
+def iter_svg_elements(svg_file):
+    """Stream the elements of an SVG file in document order
 
-def path_to_polyline(path_data, precision):
-    """Convert SVG path to polyline with the given precision"""
+    Returns a generator of (tag, attrib) pairs, and the SVG's width and height.
+    Each attrib is cleared once the generator moves on, so copy it if you need to keep it.
+    """
     
-    # Parse the path data
-    path = parse_path(path_data)
+    events = ET.iterparse(svg_file, events=('start', 'end'))
     
-    # Calculate the number of points based on precision
-    points = []
+    # The first event is the opening <svg> tag, which carries the size
+    _, root = next(events)
+    width, height = _svg_size(root.attrib)
     
+    return _iter_elements(events, root), width, height
+
+def _iter_shapes(elements, stats=None, report_errors=True):
+    # A malformed shape is reported and skipped instead of ending the whole conversion
+    i = 0
+    for tag, attrib in elements:
+        if tag not in SHAPE_TAGS:
+            continue
+        try:
+            path = element_to_path(tag, attrib)
+        except Exception as e:
+            if report_errors:
+                print(f"Error processing path #{i}: {e}")
+            path = None
+        i += 1
+        if path is not None:
+            if stats is not None:
+                stats.add(f'elements.{tag}')
+            yield path
+
+def extract_paths_from_svg(svg_file, stats=None, report_errors=True):
+    """Extract shapes from SVG file in a single streaming pass
+
+    Returns a generator of svg.path Path objects in document order, and the SVG's width and height.
+    If stats is given, every shape is counted by its element type. Shapes that fail to parse are skipped, with
+    an error message unless report_errors is False.
+    """
+    
+    elements, width, height = iter_svg_elements(svg_file)
+    return _iter_shapes(elements, stats, report_errors), width, height
+
+def sample_segment(segment, t):
+    """Evaluate a path segment at every parameter in the array t at once, returning an (N, 2) array
+
+    Mirrors segment.point() for Line/Close, QuadraticBezier, CubicBezier and Arc,
+    and agrees with it to within 1e-9 SVG units for drawings of ordinary size.
+    """
+    t = np.asarray(t, dtype=float)
+    start = np.array([segment.start.real, segment.start.imag])
+    end = np.array([segment.end.real, segment.end.imag])
+    tc = t[:, None]
+
+    if isinstance(segment, CubicBezier):
+        c1 = np.array([segment.control1.real, segment.control1.imag])
+        c2 = np.array([segment.control2.real, segment.control2.imag])
+        mt = 1 - tc
+        return (mt ** 3) * start + (3 * mt ** 2 * tc) * c1 + (3 * mt * tc ** 2) * c2 + (tc ** 3) * end
+
+    if isinstance(segment, QuadraticBezier):
+        c = np.array([segment.control.real, segment.control.imag])
+        mt = 1 - tc
+        return (mt ** 2) * start + (2 * mt * tc) * c + (tc ** 2) * end
+
+    if isinstance(segment, Arc):
+        if segment.start == segment.end:
+            # Equivalent of omitting the segment
+            return np.repeat(start[None, :], len(t), axis=0)
+        if segment.radius.real == 0 or segment.radius.imag == 0:
+            # Treated as a straight line
+            return start + (end - start) * tc
+
+        angle = np.radians(segment.theta + segment.delta * t)
+        cosr = math.cos(math.radians(segment.rotation))
+        sinr = math.sin(math.radians(segment.rotation))
+        radius = segment.radius * segment.radius_scale
+        cos_a = np.cos(angle)
+        sin_a = np.sin(angle)
+        xs = cosr * cos_a * radius.real - sinr * sin_a * radius.imag + segment.center.real
+        ys = sinr * cos_a * radius.real + cosr * sin_a * radius.imag + segment.center.imag
+        return np.column_stack((xs, ys))
+
+    # Line, Close and anything else linear
+    return start + (end - start) * tc
+
+def _bezier_flatness(ctrl):
+    """Upper bound of the distance between a Bezier curve and its chord, from its control polygon"""
+    start, end = ctrl[0], ctrl[-1]
+    chord = end - start
+    chord_len2 = chord[0] ** 2 + chord[1] ** 2
+    inner = ctrl[1:-1] - start
+    if chord_len2 == 0:
+        return float(np.hypot(inner[:, 0], inner[:, 1]).max())
+    # Distance of the inner control points to the chord segment, not its line, so curves that double back
+    # past either end are not mistaken for flat ones
+    along = np.clip((inner @ chord) / chord_len2, 0, 1)
+    offset = inner - along[:, None] * chord
+    return float(np.hypot(offset[:, 0], offset[:, 1]).max())
+
+def _bezier_split(ctrl):
+    """Split a Bezier control polygon in half with de Casteljau's algorithm"""
+    left = [ctrl[0]]
+    right = [ctrl[-1]]
+    level = ctrl
+    while len(level) > 1:
+        level = (level[:-1] + level[1:]) / 2
+        left.append(level[0])
+        right.append(level[-1])
+    return np.array(left), np.array(right[::-1])
+
+def adaptive_parameters(segment, tolerance):
+    """Choose t values for a segment so that no chord deviates from the curve by more than tolerance"""
+    
+    if isinstance(segment, Arc) and segment.start != segment.end \
+            and segment.radius.real != 0 and segment.radius.imag != 0:
+        # Sagitta of a circular arc step is r * (1 - cos(step / 2)); the larger radius bounds the ellipse
+        radius = max(abs(segment.radius.real), abs(segment.radius.imag)) * segment.radius_scale
+        if tolerance >= radius:
+            steps = 2
+        else:
+            max_step = 2 * math.acos(1 - tolerance / radius)
+            steps = max(2, math.ceil(math.radians(abs(segment.delta)) / max_step))
+        return np.linspace(0, 1, steps + 1)
+    
+    if isinstance(segment, (CubicBezier, QuadraticBezier)):
+        if isinstance(segment, CubicBezier):
+            controls = [segment.start, segment.control1, segment.control2, segment.end]
+        else:
+            controls = [segment.start, segment.control, segment.end]
+        ctrl = np.array([[c.real, c.imag] for c in controls])
+        
+        # Recursive de Casteljau subdivision, kept on an explicit stack in t order
+        ts = [0.0]
+        stack = [(ctrl, 0.0, 1.0, 0)]
+        while stack:
+            part, t0, t1, depth = stack.pop()
+            if depth >= MAX_SUBDIVISION_DEPTH or _bezier_flatness(part) <= tolerance:
+                ts.append(t1)
+                continue
+            left, right = _bezier_split(part)
+            mid = (t0 + t1) / 2
+            stack.append((right, mid, t1, depth + 1))
+            stack.append((left, t0, mid, depth + 1))
+        return np.array(ts)
+    
+    # Straight lines only need their endpoints
+    return np.array([0.0, 1.0])
+
+def _polynomial_speed(coefficients, t):
+    """|B'(t)| for rows of derivative coefficients (K, 3, 2), B'(t) = a t^2 + b t + c, at parameters t of shape (K, M)"""
+    t = t[..., None]
+    derivative = (coefficients[:, None, 0] * t + coefficients[:, None, 1]) * t + coefficients[:, None, 2]
+    return np.hypot(derivative[..., 0], derivative[..., 1])
+
+def _arc_speed(params, t):
+    """|d point / dt| for rows of (rx, ry, theta, delta) elliptical arcs, angles in radians; rotation does not matter"""
+    angle = params[:, 2:3] + params[:, 3:4] * t
+    return np.abs(params[:, 3:4]) * np.hypot(params[:, 0:1] * np.sin(angle), params[:, 1:2] * np.cos(angle))
+
+def _stretched_arc_speed(params, t):
+    """|d point / dt| for rows of (rx, ry, theta, delta, rotation, sx, sy) elliptical arcs whose X and Y are then
+    stretched by sx and sy, angles in radians"""
+    angle = params[:, 2:3] + params[:, 3:4] * t
+    dx, dy = -params[:, 0:1] * np.sin(angle), params[:, 1:2] * np.cos(angle)
+    cos, sin = np.cos(params[:, 4:5]), np.sin(params[:, 4:5])
+    return np.abs(params[:, 3:4]) * np.hypot(params[:, 5:6] * (cos * dx - sin * dy), params[:, 6:7] * (sin * dx + cos * dy))
+
+def _speed_of(segment, scale=None):
+    """Describe the speed of a curved segment as (speed function, parameter row), or None if it is straight or empty
+
+    scale=(sx, sy) describes the segment with X and Y stretched by these factors.
+    """
+    if isinstance(segment, CubicBezier):
+        p0, p1, p2, p3 = (np.array([c.real, c.imag]) for c in (segment.start, segment.control1, segment.control2, segment.end))
+        coefficients = np.array([3 * (p3 - 3 * p2 + 3 * p1 - p0), 6 * (p2 - 2 * p1 + p0), 3 * (p1 - p0)])
+        return _polynomial_speed, coefficients if scale is None else coefficients * scale
+    if isinstance(segment, QuadraticBezier):
+        p0, p1, p2 = (np.array([c.real, c.imag]) for c in (segment.start, segment.control, segment.end))
+        coefficients = np.array([np.zeros(2), 2 * (p2 - 2 * p1 + p0), 2 * (p1 - p0)])
+        return _polynomial_speed, coefficients if scale is None else coefficients * scale
+    if isinstance(segment, Arc) and segment.start != segment.end \
+            and segment.radius.real != 0 and segment.radius.imag != 0:
+        radius = segment.radius * segment.radius_scale
+        params = [abs(radius.real), abs(radius.imag), math.radians(segment.theta), math.radians(segment.delta)]
+        if scale is None:
+            return _arc_speed, np.array(params)
+        if scale[0] == scale[1]:
+            # A uniform stretch keeps the ellipse's shape, just bigger
+            return _arc_speed, np.array([params[0] * scale[0], params[1] * scale[0], *params[2:]])
+        return _stretched_arc_speed, np.array([*params, math.radians(segment.rotation), *scale])
+    return None
+
+def _gauss_integrate(speed, params, t0, t1):
+    """Integrate speed over [t0, t1] (arrays of shape (K, M)) with one Gauss-Legendre panel each, returning (K, M)"""
+    width = (t1 - t0)[..., None]
+    nodes = t0[..., None] + width * GAUSS_NODES
+    shape = nodes.shape
+    values = speed(params, nodes.reshape(shape[0], -1)).reshape(shape)
+    return (values * GAUSS_WEIGHTS).sum(axis=-1) * width[..., 0]
+
+def _gauss_lengths(speed, params, tolerance):
+    """Lengths and error bounds of K curves sharing a speed function, by composite Gauss-Legendre quadrature
+
+    The number of panels is doubled until two successive estimates agree to within tolerance (relative);
+    their difference bounds the error of the coarser estimate, and the finer one is returned.
+    """
+    def composite(rows, panels):
+        edges = np.broadcast_to(np.linspace(0, 1, panels + 1), (len(rows), panels + 1))
+        return _gauss_integrate(speed, rows, edges[:, :-1], edges[:, 1:]).sum(axis=1)
+
+    lengths = composite(params, 1)
+    errors = np.full(len(params), np.inf)
+    pending = np.arange(len(params))
+    panels = 1
+    while pending.size and panels < MAX_LENGTH_PANELS:
+        panels *= 2
+        refined = composite(params[pending], panels)
+        difference = np.abs(refined - lengths[pending])
+        lengths[pending] = refined
+        errors[pending] = difference
+        pending = pending[difference > tolerance * refined]
+    return lengths, errors
+
+def _quadratic_lengths(coefficients):
+    """Closed-form lengths of quadratic Beziers from their derivative coefficients
+
+    Around the parameter of least speed t0 the speed is sqrt(k^2 s^2 + h^2) with s = t - t0, whose integral
+    stays accurate for nearly collinear control points, including curves that double back on themselves.
+    """
+    d, b = coefficients[:, 1], coefficients[:, 2] # B'(t) = d t + b
+    k = np.hypot(d[:, 0], d[:, 1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t0 = -(d * b).sum(axis=1) / k ** 2
+        h = np.abs(d[:, 0] * b[:, 1] - d[:, 1] * b[:, 0]) / k
+        s0, s1 = -t0, 1 - t0
+        r0, r1 = np.sqrt((k * s0) ** 2 + h ** 2), np.sqrt((k * s1) ** 2 + h ** 2)
+        # With both ends on the same side of t0 the differences are rewritten using s1 - s0 = 1, so they do not cancel
+        same = s0 * s1 > 0
+        ends = np.where(same, (s1 + s0) * (k ** 2 * (s1 ** 2 + s0 ** 2) + h ** 2) / (s1 * r1 + s0 * r0), s1 * r1 - s0 * r0)
+        x0, x1 = k * s0 / h, k * s1 / h
+        q0, q1 = np.sqrt(1 + x0 ** 2), np.sqrt(1 + x1 ** 2)
+        angle = np.where(same, np.arcsinh((x1 - x0) * (x1 + x0) / (x1 * q0 + x0 * q1)), np.arcsinh(x1) - np.arcsinh(x0))
+        lengths = (ends + np.where(h > 0, h ** 2 / k * angle, 0)) / 2
+    # Constant speed: a straight line traversed uniformly
+    straight = k == 0
+    lengths[straight] = np.hypot(b[straight, 0], b[straight, 1])
+    return lengths
+
+def arc_lengths(segments, tolerance=LENGTH_TOLERANCE, scale=None):
+    """Lengths of many segments at once, returning (lengths, error bounds) as arrays
+
+    Lines, quadratic Beziers and circular arcs use exact formulas (error bound 0), cubic Beziers and
+    elliptical arcs use composite Gauss-Legendre quadrature batched over all segments of the same kind.
+    Move segments have length 0. scale=(sx, sy) measures the segments with X and Y stretched by these factors.
+    """
+    lengths = np.zeros(len(segments))
+    errors = np.zeros(len(segments))
+    batches = {}
+    for i, segment in enumerate(segments):
+        if isinstance(segment, Move):
+            continue
+        described = _speed_of(segment, scale)
+        if described is None:
+            if not (isinstance(segment, Arc) and segment.start == segment.end):
+                delta = segment.end - segment.start
+                lengths[i] = abs(delta) if scale is None else math.hypot(delta.real * scale[0], delta.imag * scale[1])
+            continue
+        speed, params = described
+        if speed is _arc_speed and params[0] == params[1]:
+            lengths[i] = params[0] * abs(params[3]) # Circular
+            continue
+        kind = 'quadratic' if isinstance(segment, QuadraticBezier) else speed
+        batches.setdefault(kind, ([], []))
+        batches[kind][0].append(i)
+        batches[kind][1].append(params)
+
+    for kind, (indices, rows) in batches.items():
+        indices, rows = np.array(indices), np.array(rows)
+        if kind == 'quadratic':
+            lengths[indices] = _quadratic_lengths(rows)
+            continue
+        lengths[indices], errors[indices] = _gauss_lengths(kind, rows, tolerance)
+    return lengths, errors
+
+def _straight_lengths(starts, ends, scale):
+    # Distances between (K, 2) start and end points, stretched by scale if given
+    deltas = ends - starts
+    if scale is not None:
+        deltas = deltas * scale
+    return np.hypot(deltas[:, 0], deltas[:, 1])
+
+def segment_lengths(path, scale=None):
+    """Length of every segment of a Path or PathArrays (NaN for Move), to be reused across path_to_polyline calls
+
+    scale=(sx, sy) measures them with X and Y stretched by these factors, see path_to_polyline.
+    """
+    if isinstance(path, PathArrays):
+        lengths = _straight_lengths(path.points[:, 0], path.points[:, 3], scale)
+        curved = np.flatnonzero(IS_CURVED[path.kinds])
+        if len(curved):
+            lengths[curved] = arc_lengths([path.segment(i) for i in curved], scale=scale)[0]
+        lengths[path.kinds == MOVE] = math.nan
+        return lengths.tolist()
+    lengths, _ = arc_lengths(path, scale=scale)
+    lengths[[isinstance(segment, Move) for segment in path]] = math.nan
+    return lengths.tolist()
+
+def extrema_parameters(segment):
+    """The t values where a segment can reach its bounding box: both ends plus every X and Y turning point"""
+    ts = [0.0, 1.0]
+    described = _speed_of(segment)
+    if described is None:
+        return np.array(ts)
+    speed, params = described
+
+    if speed is _polynomial_speed:
+        # Roots of a t^2 + b t + c, the derivative along each axis
+        for a, b, c in params.T.tolist():
+            if abs(a) < 1e-12 * (abs(b) + abs(c)):
+                roots = [-c / b] if b != 0 else []
+            else:
+                discriminant = b * b - 4 * a * c
+                if discriminant < 0:
+                    continue
+                root = math.sqrt(discriminant)
+                roots = [(-b - root) / (2 * a), (-b + root) / (2 * a)]
+            ts.extend(t for t in roots if 0 < t < 1)
+    else:
+        # X and Y turn where the angle is perpendicular to that axis, once every half turn
+        cosr, sinr = math.cos(math.radians(segment.rotation)), math.sin(math.radians(segment.rotation))
+        radius = segment.radius * segment.radius_scale
+        theta, delta = params[2], params[3]
+        low, high = min(theta, theta + delta), max(theta, theta + delta)
+        for angle in (math.atan2(-sinr * radius.imag, cosr * radius.real), math.atan2(cosr * radius.imag, sinr * radius.real)):
+            for k in range(math.ceil((low - angle) / math.pi), math.floor((high - angle) / math.pi) + 1):
+                ts.append((angle + k * math.pi - theta) / delta)
+    return np.array(ts)
+
+def path_bounds(path):
+    """Exact bounding box (min_x, min_y, max_x, max_y) of a Path's geometry without sampling it, or None if it is empty"""
+    chunks = []
+    if isinstance(path, PathArrays):
+        # Every segment passes through its ends, and straight segments and moves stay between them;
+        # only curves need their turning points
+        if not len(path):
+            return None
+        ends = path.points[:, ::3].reshape(-1, 2)
+        curved = np.flatnonzero(IS_CURVED[path.kinds]).tolist()
+        if not curved:
+            return (*ends.min(axis=0).tolist(), *ends.max(axis=0).tolist())
+        chunks.append(ends)
+        path = [path.segment(i) for i in curved]
     for segment in path:
         if isinstance(segment, Move):
-            # For Move commands, just add the destination point
-            points.append((segment.end.real, segment.end.imag))
+            chunks.append(np.array([[segment.end.real, segment.end.imag]]))
+        else:
+            chunks.append(sample_segment(segment, extrema_parameters(segment)))
+    if not chunks:
+        return None
+    points = np.concatenate(chunks)
+    if not len(points):
+        return None
+    return (*points.min(axis=0).tolist(), *points.max(axis=0).tolist())
+
+def merge_bounds(bounds, other):
+    """Union of two bounding boxes, either of which may be None"""
+    if bounds is None or other is None:
+        return other if bounds is None else bounds
+    return (min(bounds[0], other[0]), min(bounds[1], other[1]), max(bounds[2], other[2]), max(bounds[3], other[3]))
+
+def segment_bounds(path):
+    """Exact bounding box of every segment of a Path or PathArrays, as a (K, 4) array of (min_x, min_y, max_x, max_y)"""
+    if isinstance(path, PathArrays):
+        ends = path.points[:, [0, 3]]
+        bounds = np.concatenate([ends.min(axis=1), ends.max(axis=1)], axis=1)
+        curved = np.flatnonzero(IS_CURVED[path.kinds]).tolist()
+        segments = [path.segment(i) for i in curved]
+    else:
+        segments = list(path)
+        curved = range(len(segments))
+        bounds = np.empty((len(segments), 4))
+    for i, segment in zip(curved, segments):
+        if isinstance(segment, Move):
+            points = np.array([[segment.end.real, segment.end.imag]])
         else:
-            # For other segments (lines, curves, arcs), sample points
-            segment_length = segment.length()
-            if segment_length == 0:
+            points = sample_segment(segment, extrema_parameters(segment))
+        bounds[i, :2] = points.min(axis=0)
+        bounds[i, 2:] = points.max(axis=0)
+    return bounds
+
+def overlaps(bounds, window):
+    """Which rows of a (N, 4) bounds array touch the (x0, y0, x1, y1) window; rows of NaN never do"""
+    x0, y0, x1, y1 = window
+    return (bounds[:, 0] <= x1) & (bounds[:, 2] >= x0) & (bounds[:, 1] <= y1) & (bounds[:, 3] >= y0)
+
+def window_sections(path, window):
+    """The parts of a path that can reach the window: every run of consecutive segments whose bounds touch it,
+    as a path of its own led by a move"""
+    reach = np.concatenate([[0], overlaps(segment_bounds(path), window), [0]]).astype(np.int8)
+    edges = np.flatnonzero(np.diff(reach)).tolist()
+    sections = []
+    for begin, end in zip(edges[0::2], edges[1::2]):
+        if isinstance(path, PathArrays):
+            sections.append(path.section(begin, end))
+            continue
+        segments = list(path)[begin:end]
+        if not isinstance(segments[0], Move):
+            segments.insert(0, Move(segments[0].start))
+        sections.append(Path(*segments))
+    return sections
+
+def window_parts(path, bounds, window):
+    """What of a path to sample for a clip window, given its path_bounds: nothing, the whole path, or its sections"""
+    if bounds is None or not overlaps(np.array([bounds]), window)[0]:
+        return []
+    x0, y0, x1, y1 = window
+    if x0 <= bounds[0] and bounds[2] <= x1 and y0 <= bounds[1] and bounds[3] <= y1:
+        return [path]
+    return window_sections(path, window)
+
+def window_in_svg_units(window, bounding_box, units='normalized'):
+    """A clip window given in CLIP_UNITS as (x0, y0, x1, y1) in SVG units, with x0 <= x1 and y0 <= y1"""
+    x0, y0, x1, y1 = window
+    if units == 'normalized':
+        # The inverse of normalize_polylines
+        min_x, min_y, max_x, max_y = bounding_box
+        x_range = (max_x - min_x) or 1
+        y_range = (max_y - min_y) or 1
+        x0, x1 = min_x + x0 * x_range, min_x + x1 * x_range
+        y0, y1 = min_y + (1 - y0) * y_range, min_y + (1 - y1) * y_range
+    return min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+
+def clip_polylines(polylines, window):
+    """Cut polylines down to the parts inside the (x0, y0, x1, y1) window, as a PolylineSet
+
+    Every edge is clipped on its own (Liang-Barsky), so a polyline leaving and re-entering the window becomes
+    several polylines, each ending exactly on the border. Single-point polylines are kept if they are inside.
+    """
+    polylines = as_polyline_set(polylines)
+    points = polylines.points
+    low, high = np.array(window[:2], dtype=float), np.array(window[2:], dtype=float)
+    starts, ends = points[:-1], points[1:]
+    deltas = ends - starts
+
+    # Parameter range of each edge that is inside the window
+    enter = np.zeros(len(starts))
+    leave = np.ones(len(starts))
+    visible = np.ones(len(starts), dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for axis in (0, 1):
+            start, delta = starts[:, axis], deltas[:, axis]
+            flat = delta == 0
+            visible &= ~flat | ((low[axis] <= start) & (start <= high[axis]))
+            near, far = (low[axis] - start) / delta, (high[axis] - start) / delta
+            enter = np.where(flat, enter, np.maximum(enter, np.minimum(near, far)))
+            leave = np.where(flat, leave, np.minimum(leave, np.maximum(near, far)))
+    visible &= enter <= leave
+    # The edges joining one polyline to the next are not part of either
+    joins = polylines.offsets[1:-1]
+    visible[joins[(joins > 0) & (joins < len(points))] - 1] = False
+
+    # A visible edge starts a new piece unless it carries on from the end of the previous one
+    edges = np.flatnonzero(visible)
+    continued = np.zeros(len(edges), dtype=bool)
+    continued[1:] = (edges[1:] == edges[:-1] + 1) & (leave[edges[:-1]] == 1) & (enter[edges[1:]] == 0)
+    entry = np.where((enter[edges] == 0)[:, None], starts[edges], starts[edges] + deltas[edges] * enter[edges, None])
+    exit = np.where((leave[edges] == 1)[:, None], ends[edges], starts[edges] + deltas[edges] * leave[edges, None])
+
+    # Each piece is its entry point followed by the exit point of every edge
+    heads = ~continued
+    clipped = np.empty((len(edges) + heads.sum(), 2))
+    exits = np.arange(len(edges)) + np.cumsum(heads)
+    clipped[exits] = exit
+    clipped[exits[heads] - 1] = entry[heads]
+    pieces = [(int(edge), piece) for edge, piece in zip(edges[heads], np.split(clipped, (exits[heads] - 1)[1:]))]
+
+    # Single points have no edges
+    sizes = np.diff(polylines.offsets)
+    for i in np.flatnonzero(sizes == 1).tolist():
+        point = points[polylines.offsets[i]]
+        if np.all((low <= point) & (point <= high)):
+            pieces.append((int(polylines.offsets[i]), point[None]))
+    pieces.sort(key=lambda piece: piece[0])
+    return PolylineSet.from_arrays([piece for _, piece in pieces])
+
+def arc_length_parameters(segment, count):
+    """Choose count + 1 t values that split a segment into count pieces of equal arc length
+
+    Straight segments and circular arcs are already uniform in t. For the others the cumulative length is
+    tabulated on count panels and each target is found by Newton's method inside its panel.
+    """
+    uniform = np.arange(count + 1) / count
+    described = _speed_of(segment)
+    if described is None or (described[0] is _arc_speed and described[1][0] == described[1][1]):
+        return uniform
+    speed, params = described
+    params = params[None]
+
+    edges = uniform[None]
+    cumulative = np.concatenate([[0.0], np.cumsum(_gauss_integrate(speed, params, edges[:, :-1], edges[:, 1:])[0])])
+    total = cumulative[-1]
+    if total == 0:
+        return uniform
+    targets = uniform[1:-1] * total
+    panel = np.clip(np.searchsorted(cumulative, targets, side='right') - 1, 0, count - 1)
+    lower, upper = uniform[panel], uniform[panel + 1]
+    span = cumulative[panel + 1] - cumulative[panel]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(span > 0, lower + (targets - cumulative[panel]) / span * (upper - lower), lower)
+
+    for _ in range(ARC_LENGTH_NEWTON_STEPS):
+        reached = cumulative[panel] + _gauss_integrate(speed, params, lower[None], t[None])[0]
+        rate = speed(params, t[None])[0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = np.where(rate > 0, (reached - targets) / rate, 0.0)
+        t = np.clip(t - step, lower, upper)
+
+    return np.concatenate([[0.0], t, [1.0]])
+
+def _segment_points(segment, precision, flatten, tolerance, segment_length):
+    # Samples of one drawing segment, or None if it adds nothing
+    if flatten == 'adaptive':
+        if isinstance(segment, (Linear, Arc)) and segment.start == segment.end:
+            return None
+        return sample_segment(segment, adaptive_parameters(segment, tolerance))
+
+    # For other segments (lines, curves, arcs), sample points
+    if segment_length == 0:
+        return None
+        
+    # Calculate number of points based on segment length and precision
+    num_points = max(2, int(segment_length * precision))
+    
+    if flatten == 'arclength':
+        t = arc_length_parameters(segment, num_points)
+    else:
+        t = np.arange(num_points + 1) / num_points
+    return sample_segment(segment, t)
+
+def _straight_run_points(kinds, starts, ends, precision, flatten, lengths):
+    # Samples of a run of moves and straight segments, all at once but exactly as they are placed one by one:
+    # segment i contributes counts[i] points at t = (j + first[i]) / steps[i] for j = 0 .. counts[i] - 1.
+    # Returns the points and counts
+    moves = kinds == MOVE
+    if flatten == 'adaptive':
+        steps = np.ones(len(kinds), dtype=np.int64)
+        counts = np.where(np.any(starts != ends, axis=1), 2, 0)
+    else:
+        lengths = np.where(moves, 0, lengths)
+        steps = np.maximum(2, (lengths * precision).astype(np.int64))
+        counts = np.where(lengths != 0, steps + 1, 0)
+    # A move adds just its end (it starts there too)
+    counts[moves] = 1
+    steps[moves] = 1
+    first = moves.astype(np.int64)
+
+    owner = np.repeat(np.arange(len(counts)), counts)
+    position = np.arange(len(owner)) - (np.cumsum(counts) - counts)[owner]
+    t = (position + first[owner]) / steps[owner]
+    return starts[owner] + (ends[owner] - starts[owner]) * t[:, None], counts
+
+def straight_paths_to_polylines(paths, precision, flatten='uniform', scale=None):
+    """path_to_polyline for many PathArrays without curves at once, returning one (N, 2) array per path
+
+    Drawings of thousands of tiny strokes would otherwise pay numpy's per-call overhead on every one of them.
+    """
+    if not paths:
+        return []
+    kinds = np.concatenate([path.kinds for path in paths])
+    points = np.concatenate([path.points for path in paths])
+    starts, ends = points[:, 0], points[:, 3]
+    lengths = None if flatten == 'adaptive' else _straight_lengths(starts, ends, scale)
+    points, counts = _straight_run_points(kinds, starts, ends, precision, flatten, lengths)
+    bounds = np.concatenate([[0], np.cumsum(counts)])[np.cumsum([len(path) for path in paths])[:-1]]
+    return np.split(points, bounds)
+
+def path_to_polyline(path_data, precision, flatten='uniform', tolerance=DEFAULT_TOLERANCE, lengths=None, scale=None):
+    """Convert SVG path (d string, Path or PathArrays) to polyline with the given precision, as an (N, 2) array
+
+    flatten='uniform' places max(2, length * precision) samples on every segment, evenly spaced in t,
+    flatten='arclength' places as many samples evenly spaced along the curve instead,
+    flatten='adaptive' subdivides each segment until the chord deviation is under tolerance.
+    lengths can carry segment_lengths(path, scale) from an earlier call to skip measuring the segments again.
+    scale=(sx, sy) gives precision and tolerance in the units the drawing is stretched to afterwards: lengths
+    are measured with X and Y stretched by these factors, and tolerance is divided by the larger one.
+    The points themselves stay in SVG units.
+    """
+    
+    # Parse the path data, unless we were handed ready-made geometry
+    path = parse_path_data(path_data) if isinstance(path_data, str) else path_data
+    if flatten != 'adaptive' and lengths is None:
+        lengths = segment_lengths(path, scale)
+    if scale is not None:
+        tolerance = tolerance / max(scale)
+    
+    # Calculate the number of points based on precision
+    chunks = []
+    
+    if isinstance(path, PathArrays) and len(path):
+        # Runs of moves and straight segments are sampled in one go, curves one segment at a time
+        curved = IS_CURVED[path.kinds]
+        edges = np.concatenate([[0], np.flatnonzero(np.diff(curved)) + 1, [len(curved)]]).tolist()
+        lengths = None if lengths is None else np.asarray(lengths, dtype=float)
+        for begin, end in zip(edges[:-1], edges[1:]):
+            if not curved[begin]:
+                points, _ = _straight_run_points(path.kinds[begin:end], path.points[begin:end, 0], path.points[begin:end, 3],
+                                                 precision, flatten, None if lengths is None else lengths[begin:end])
+                chunks.append(points)
                 continue
-                
-            # Calculate number of points based on segment length and precision
-            num_points = max(2, int(segment_length * precision))
-            
-            for i in range(num_points + 1):
-                t = i / num_points
-                point = segment.point(t)
-                points.append((point.real, point.imag))
+            for i in range(begin, end):
+                points = _segment_points(path.segment(i), precision, flatten, tolerance,
+                                         None if lengths is None else lengths[i])
+                if points is not None:
+                    chunks.append(points)
+    else:
+        for i, segment in enumerate(path):
+            if isinstance(segment, Move):
+                # For Move commands, just add the destination point
+                chunks.append(np.array([[segment.end.real, segment.end.imag]]))
+            else:
+                points = _segment_points(segment, precision, flatten, tolerance, None if lengths is None else lengths[i])
+                if points is not None:
+                    chunks.append(points)
     
-    return points
+    if not chunks:
+        return np.empty((0, 2))
+    return np.concatenate(chunks)
+
+class PolylineSet:
+    """Many polylines stored as one contiguous (M, 2) float64 buffer plus an offsets array
+
+    Polyline i is points[offsets[i]:offsets[i + 1]]; indexing and iterating yield these (N, 2) views,
+    so whole-drawing operations (bounding box, normalization, coordinate conversion) are one array operation.
+    """
+
+    def __init__(self, points, offsets):
+        self.points = points
+        self.offsets = offsets
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        arrays = [np.asarray(a, dtype=float).reshape(-1, 2) for a in arrays]
+        offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(a) for a in arrays])
+        points = np.concatenate(arrays) if arrays else np.empty((0, 2))
+        return cls(points, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.points[self.offsets[i]:self.offsets[i + 1]]
+
+    def __iter__(self):
+        for start, end in zip(self.offsets[:-1].tolist(), self.offsets[1:].tolist()):
+            yield self.points[start:end]
+
+    def with_points(self, points):
+        """Same polylines with every point replaced, e.g. after a coordinate transform"""
+        return PolylineSet(points, self.offsets)
+
+    def select(self, mask):
+        """Keep only the points where mask is True"""
+        kept = np.zeros(len(mask) + 1, dtype=np.int64)
+        np.cumsum(mask, out=kept[1:])
+        return PolylineSet(self.points[mask], kept[self.offsets])
+
+def as_polyline_set(polylines):
+    return polylines if isinstance(polylines, PolylineSet) else PolylineSet.from_arrays(polylines)
 
 def find_bounding_box(all_points):
     """Find bounding box for all points across all polylines"""
-    if not all_points or len(all_points) == 0:
+    flat_points = as_polyline_set(all_points).points
+    if len(flat_points) == 0:
         return (0, 0, 1, 1)  # Default bounding box
     
-    # Flatten the list of points
-    flat_points = [point for sublist in all_points for point in sublist]
-    
     # Find min/max coordinates
-    min_x = min(p[0] for p in flat_points)
-    max_x = max(p[0] for p in flat_points)
-    min_y = min(p[1] for p in flat_points)
-    max_y = max(p[1] for p in flat_points)
+    min_x, min_y = flat_points.min(axis=0).tolist()
+    max_x, max_y = flat_points.max(axis=0).tolist()
     
     return min_x, min_y, max_x, max_y
 
@@ -228,118 +841,310 @@ def normalize_polylines(all_polylines, bounding_box):
     if y_range == 0:
         y_range = 1
     
-    normalized_polylines = []
-    
-    for polyline in all_polylines:
-        normalized_points = []
-        for x, y in polyline:
-            norm_x = (x - min_x) / x_range
-            norm_y = 1 + (min_y - y) / y_range # In UI the Y axis grows bottom up
-            normalized_points.append((norm_x, norm_y))
-        normalized_polylines.append(normalized_points)
+    polylines = as_polyline_set(all_polylines)
+    points = np.empty_like(polylines.points)
+    points[:, 0] = (polylines.points[:, 0] - min_x) / x_range
+    points[:, 1] = 1 + (min_y - polylines.points[:, 1]) / y_range # In UI the Y axis grows bottom up
     
-    return normalized_polylines
+    return polylines.with_points(points)
 
-def visualize_polylines(all_polylines, title="Normalized Polylines"):
-    import matplotlib.pyplot as plt
+def visualize_polylines(all_polylines, title="Normalized Polylines", output=None):
+    """Show normalized polylines in a window, or save them to output (e.g. a PNG) without one, see preview.render"""
+    from preview import render
+    return render(all_polylines, title, "X (Normalized)", "Y (Normalized)", limits=(0, 0, 1, 1), output=output)
 
-    # Plot the normalized polylines
-    fig, ax = plt.subplots(figsize=(8, 8))
-    
-    # Use different colors for each polyline
-    colors = plt.cm.tab10.colors
-    
-    for i, polyline in enumerate(all_polylines):
-        xs = [p[0] for p in polyline]
-        ys = [p[1] for p in polyline]
-        ax.plot(xs, ys, '-', color=colors[i % len(colors)], label=f"Path {i+1}")
-    
-    # Add some points to show the vertices
-    for i, polyline in enumerate(all_polylines):
-        xs = [p[0] for p in polyline]
-        ys = [p[1] for p in polyline]
-        ax.plot(xs, ys, 'o', color=colors[i % len(colors)], markersize=3, alpha=0.5)
-    
-    ax.set_title(title)
-    ax.set_xlim(0, 1)
-    ax.set_ylim(0, 1)
-    ax.set_xlabel("X (Normalized)")
-    ax.set_ylabel("Y (Normalized)")
-    ax.grid(True)
-    
-    # Add legend if there are not too many polylines
-    if len(all_polylines) <= 10:
-        ax.legend(loc='best')
-    
-    plt.tight_layout()
-    plt.show(block=True)
+class PipelineStats:
+    """Collects wall time and peak memory per stage, plus named counters
 
-def get_normalized_polylines(svg_file, precision=1.0):
-    """Extract and normalize polylines from an SVG file"""
-    
-    paths, _, _ = extract_paths_from_svg(svg_file)
-    
-    original_polylines = []
-    all_points = []
-    
-    # First pass: convert all paths to polylines
-    for i, path_data in enumerate(paths):
+    Pass one to Pipeline(stats=...) to collect the same metrics main.py reports with --stats.
+    Peak memory comes from tracemalloc, which is started on first use and slows things down noticeably.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}   # Stage name -> {'seconds': float, 'peak_bytes': int or None}
+        self.counters = {}
+
+    @contextmanager
+    def stage(self, name):
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
         try:
-            polyline_points = path_to_polyline(path_data, precision)
-            if polyline_points:
-                original_polylines.append(polyline_points)
-                all_points.append(polyline_points)
-        except Exception as e:
-            print(f"Error processing path #{i}: {e}")
-    
-    # Find the bounding box for all polylines
-    bounding_box = find_bounding_box(all_points)
-    print(f"Bounding box: {bounding_box}")
+            yield
+        finally:
+            entry = self.stages.setdefault(name, {'seconds': 0.0, 'peak_bytes': None})
+            entry['seconds'] += time.perf_counter() - started
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1] - base
+                entry['peak_bytes'] = max(entry['peak_bytes'] or 0, peak)
+
+    def timed(self, name, iterable):
+        """Pass items through, adding the time spent producing them to a stage (without memory tracking)"""
+        entry = self.stages.setdefault(name, {'seconds': 0.0, 'peak_bytes': None})
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                entry['seconds'] += time.perf_counter() - started
+                return
+            entry['seconds'] += time.perf_counter() - started
+            yield item
+
+    def add(self, name, count=1):
+        self.counters[name] = self.counters.get(name, 0) + count
+
+    def as_dict(self):
+        return {'stages': self.stages, 'counters': self.counters}
+
+    def format(self):
+        lines = ['Stage          Time (ms)   Peak memory (KiB)']
+        for name, entry in self.stages.items():
+            peak = f"{entry['peak_bytes'] / 1024:.1f}" if entry['peak_bytes'] is not None else '-'
+            lines.append(f"{name:<14} {entry['seconds'] * 1000:>9.1f}   {peak:>17}")
+        lines.append('')
+        for name, count in self.counters.items():
+            lines.append(f"{name:<24} {count:g}")
+        return '\n'.join(lines)
+
+@dataclass
+class ConversionResult:
+    """Every intermediate stage of converting one SVG file into normalized polylines"""
+    svg_file: str
+    width: float                # SVG size, from width/height or viewBox
+    height: float
+    paths: list                 # svg.path Path objects in document order (None when loaded from cache)
+    polylines: PolylineSet      # Sampled points in SVG units, empty paths dropped (None when loaded from cache)
+    bounding_box: tuple         # (min_x, min_y, max_x, max_y) over all polylines
+    normalized_polylines: PolylineSet  # Polylines mapped into the 0-1 range, Y growing upwards
+    from_cache: bool = False
+
+class Pipeline:
+    """Runs parse -> sample -> bbox -> normalize once, keeping every stage around
+
+    With a PolylineCache, a file that was already sampled with the same settings skips all stages.
+    """
+
+    def __init__(self, precision=1.0, flatten='uniform', tolerance=DEFAULT_TOLERANCE, cache=None, stats=None,
+                 clip=None, clip_units='normalized', output_size=None):
+        self.precision = precision
+        self.flatten = flatten
+        self.tolerance = tolerance
+        self.cache = cache
+        self.stats = stats
+        self.clip = None if clip is None else tuple(clip)  # (x0, y0, x1, y1) window in clip_units, see cull()
+        self.clip_units = clip_units
+        # (width, height) the normalized drawing is stretched to, e.g. quarter notes and semitones. When given,
+        # precision and tolerance are measured there instead of in SVG units, see path_to_polyline
+        self.output_size = None if output_size is None else tuple(output_size)
+
+    def _stage(self, name):
+        return self.stats.stage(name) if self.stats is not None else nullcontext()
+
+    def settings(self):
+        """Everything that affects the sampled points, used as part of the cache key"""
+        settings = {'sampler': SAMPLER_VERSION, 'precision': self.precision, 'flatten': self.flatten,
+                    'tolerance': self.tolerance if self.flatten == 'adaptive' else None}
+        if self.clip is not None:
+            settings['clip'] = [*self.clip, self.clip_units]
+        if self.output_size is not None:
+            settings['output_size'] = list(self.output_size)
+        return settings
+
+    def scale(self, bounding_box):
+        """The (sx, sy) stretch from SVG units to output units for this bounding box, None when sampling in SVG units"""
+        if self.output_size is None:
+            return None
+        min_x, min_y, max_x, max_y = bounding_box
+        # Same zero-size handling as normalize_polylines
+        return self.output_size[0] / ((max_x - min_x) or 1), self.output_size[1] / ((max_y - min_y) or 1)
+
+    def extract(self, svg_file):
+        with self._stage('extract'):
+            paths, width, height = extract_paths_from_svg(svg_file, self.stats)
+            paths = list(paths)
+        return paths, width, height
+
+    def index(self, paths):
+        """Exact bounds of every path (see path_bounds) as an (N, 4) array with NaN rows for empty paths,
+        and the drawing's bounding box"""
+        with self._stage('index'):
+            index = np.array([path_bounds(path) or (math.nan,) * 4 for path in paths]).reshape(-1, 4)
+            drawn = ~np.isnan(index[:, 0])
+            bounding_box = (0, 0, 1, 1)
+            if drawn.any():
+                bounding_box = (*index[drawn, :2].min(axis=0).tolist(), *index[drawn, 2:].max(axis=0).tolist())
+        return index, bounding_box
+
+    def cull(self, paths):
+        """Drop what lies outside the clip window before sampling, returning (paths, bounding box, window in SVG units)
+
+        Every path's exact bounds (see path_bounds) go into an index; paths inside the window are kept whole and
+        paths crossing its border are cut down to the segments that reach it (see window_sections). The bounding
+        box is the whole drawing's, so the visible part lands where it would without clipping.
+        """
+        index, bounding_box = self.index(paths)
+        with self._stage('cull'):
+            window = window_in_svg_units(self.clip, bounding_box, self.clip_units)
+            reach = np.flatnonzero(overlaps(index, window)).tolist()
+            visible = [part for i in reach for part in window_parts(paths[i], index[i], window)]
+        if self.stats is not None:
+            self.stats.add('paths.culled', len(paths) - len(reach))
+        return visible, bounding_box, window
+
+    def sample(self, paths, lengths=None, window=None, scale=None):
+        """Sample paths into a PolylineSet, dropping empty ones; with a window the polylines are clipped to it
+
+        scale is the Pipeline.scale() of the drawing when sampling in output units.
+        """
+        polylines = []
+        with self._stage('sample'):
+            # Paths made of straight segments only are sampled together
+            straight = [i for i, path in enumerate(paths) if isinstance(path, PathArrays) and path.straight]
+            batched = dict(zip(straight, straight_paths_to_polylines([paths[i] for i in straight],
+                                                                     self.precision, self.flatten, scale)))
+            for i, path in enumerate(paths):
+                try:
+                    if i in batched:
+                        polyline_points = batched[i]
+                    else:
+                        polyline_points = path_to_polyline(path, self.precision, self.flatten, self.tolerance,
+                                                           lengths[i] if lengths is not None else None, scale)
+                    if len(polyline_points):
+                        polylines.append(polyline_points)
+                except Exception as e:
+                    print(f"Error processing path #{i}: {e}")
+            polylines = PolylineSet.from_arrays(polylines)
+        if self.stats is not None:
+            self.stats.add('points.sampled', len(polylines.points))
+        if window is not None:
+            with self._stage('clip'):
+                polylines = clip_polylines(polylines, window)
+        return polylines
+
+    def normalize(self, polylines, bounding_box=None):
+        with self._stage('normalize'):
+            if bounding_box is None:
+                bounding_box = find_bounding_box(polylines)
+            normalized_polylines = normalize_polylines(polylines, bounding_box)
+        return bounding_box, normalized_polylines
+
+    def run(self, svg_file):
+        if self.cache is not None:
+            key = self.cache.key(svg_file, self.settings())
+            cached = self.cache.load(key)
+            if cached is not None:
+                normalized_polylines, bounding_box, width, height = cached
+                if self.stats is not None:
+                    self.stats.add('cache.hits')
+                    self.stats.add('points.sampled', len(normalized_polylines.points))
+                return ConversionResult(svg_file, width, height, None, None, bounding_box, normalized_polylines, True)
+
+        paths, width, height = self.extract(svg_file)
+        bounding_box = window = None
+        if self.clip is not None:
+            paths, bounding_box, window = self.cull(paths)
+        elif self.output_size is not None:
+            # Sampling in output units needs the drawing's size first
+            _, bounding_box = self.index(paths)
+        polylines = self.sample(paths, window=window, scale=None if bounding_box is None else self.scale(bounding_box))
+        
+        # Normalize all polylines using the same bounding box
+        bounding_box, normalized_polylines = self.normalize(polylines, bounding_box)
+        
+        if self.cache is not None:
+            self.cache.store(key, normalized_polylines, bounding_box, width, height)
+        
+        return ConversionResult(svg_file, width, height, paths, polylines, bounding_box, normalized_polylines)
+
+    def stream(self, svg_file):
+        """Two passes over the file that never hold more than one path, for drawings too large for run()
+
+        The first pass takes the bounding box from the geometry itself (see path_bounds), the second samples
+        and normalizes one path at a time. Returns a generator of normalized (N, 2) polylines in document order,
+        the bounding box, and the SVG's width and height. svg_file must be a path, as it is read twice.
+        With a clip window the first pass also keeps every path's bounds, so the second can skip or cut paths as cull() does.
+        The bounding box follows the exact curves, so it can be a hair larger than the one run() finds from samples.
+        """
+        with self._stage('bounds'):
+            paths, width, height = extract_paths_from_svg(svg_file, self.stats)
+            bounding_box = None
+            index = [] # Per-path bounds, only kept to cull against the clip window
+            for path in paths:
+                bounds = path_bounds(path)
+                bounding_box = merge_bounds(bounding_box, bounds)
+                if self.clip is not None:
+                    index.append(bounds)
+            if bounding_box is None:
+                bounding_box = (0, 0, 1, 1)
+            window = None if self.clip is None else window_in_svg_units(self.clip, bounding_box, self.clip_units)
+            scale = self.scale(bounding_box)
+
+        def polylines():
+            # Parse errors were already reported by the first pass
+            paths, _, _ = extract_paths_from_svg(svg_file, report_errors=False)
+            for i, path in enumerate(paths):
+                parts = [path] if window is None else window_parts(path, index[i], window)
+                if not parts:
+                    continue
+                try:
+                    sampled = [path_to_polyline(part, self.precision, self.flatten, self.tolerance, scale=scale) for part in parts]
+                except Exception as e:
+                    print(f"Error processing path #{i}: {e}")
+                    continue
+                if parts[0] is not path:
+                    # Only sections of paths crossing the window's border stick out of it
+                    sampled = clip_polylines([points for points in sampled if len(points)], window)
+                for points in sampled:
+                    if len(points):
+                        if self.stats is not None:
+                            self.stats.add('points.sampled', len(points))
+                        yield normalize_polylines([points], bounding_box)[0]
+
+        stream = polylines()
+        if self.stats is not None:
+            stream = self.stats.timed('sample', stream)
+        return stream, bounding_box, width, height
+
+def get_normalized_polylines(svg_file, precision=1.0, flatten='uniform', tolerance=DEFAULT_TOLERANCE):
+    """Extract and normalize polylines from an SVG file"""
     
-    # Normalize all polylines using the same bounding box
-    normalized_polylines = normalize_polylines(original_polylines, bounding_box)
+    result = Pipeline(precision, flatten, tolerance).run(svg_file)
+    print(f"Bounding box: {result.bounding_box}")
     
-    return normalized_polylines
+    return result.normalized_polylines
 
 def main():
     parser = argparse.ArgumentParser(description='Convert SVG to normalized polylines')
     parser.add_argument('svg_file', help='Input SVG file')
     parser.add_argument('--precision', '-p', type=float, default=1.0, 
                         help='Polyline precision (higher values = more points)')
+    parser.add_argument('--flatten', choices=FLATTEN_MODES, default='uniform',
+                        help='Curve flattening mode (default: uniform)')
+    parser.add_argument('--tolerance', '-t', type=float, default=DEFAULT_TOLERANCE,
+                        help='Maximum chord deviation in SVG units for --flatten adaptive')
     parser.add_argument('--output', '-o', help='Output file (defaults to stdout)')
     parser.add_argument('--visualize', '-v', action='store_true', 
                         help='Visualize the normalized polylines')
+    parser.add_argument('--save-preview', type=str,
+                        help='Save the visualization to this image file (e.g. a PNG) instead of showing it; works without a display')
     
     args = parser.parse_args()
     
     try:
-        paths, width, height = extract_paths_from_svg(args.svg_file)
-        
-        original_polylines = []
-        all_points = []
-        
-        # First pass: convert all paths to polylines
-        for i, path_data in enumerate(paths):
-            try:
-                polyline_points = path_to_polyline(path_data, args.precision)
-                if polyline_points:
-                    original_polylines.append(polyline_points)
-                    all_points.append(polyline_points)
-            except Exception as e:
-                print(f"Error processing path #{i}: {e}")
-        
-        # Find the bounding box for all polylines
-        bounding_box = find_bounding_box(all_points)
-        print(f"Bounding box: {bounding_box}")
-        
-        # Normalize all polylines using the same bounding box
-        normalized_polylines = get_normalized_polylines(args.svg_file, args.precision)
+        result = Pipeline(args.precision, args.flatten, args.tolerance).run(args.svg_file)
+        print(f"Bounding box: {result.bounding_box}")
         
         # Generate output
         output_text = "# Normalized polylines (whole picture normalization)\n"
-        output_text += f"# Bounding box: {bounding_box}\n\n"
+        output_text += f"# Bounding box: {result.bounding_box}\n\n"
         
-        for i, polyline in enumerate(normalized_polylines):
+        for i, polyline in enumerate(result.normalized_polylines):
             output_text += f"# Polyline {i+1}\n"
             for j, (x, y) in enumerate(polyline):
                 output_text += f"{x:.6f}, {y:.6f}\n"
@@ -351,13 +1156,15 @@ def main():
                 f.write(output_text)
             print(f"Output written to {args.output}")
         else:
-            if not args.visualize and not args.save_plot:
+            if not args.visualize and not args.save_preview:
                 print(output_text)
         
         # Visualize
-        if args.visualize:
-            fig = visualize_polylines(normalized_polylines,
-                                        f"Normalized Polylines - Whole Picture (Precision: {args.precision})")
+        if args.visualize or args.save_preview:
+            visualize_polylines(result.normalized_polylines,
+                                f"Normalized Polylines - Whole Picture (Precision: {args.precision})", args.save_preview)
+            if args.save_preview:
+                print(f"Preview written to {args.save_preview}")
             
     except Exception as e:
         print(f"Error: {e}")
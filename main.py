@@ -1,212 +1,927 @@
 
 import sys
+import math
 import argparse
 import os
-import uuid
-from claude import get_normalized_polylines
-from consts import *
+import glob
+import time
+import json
+import hashlib
+import io
+import socketserver
+from collections import OrderedDict, defaultdict
+from contextlib import redirect_stdout
+from dataclasses import dataclass
+from xml.etree.ElementTree import ParseError
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from claude import Pipeline, PipelineStats, ConversionResult, PolylineSet, as_polyline_set, segment_lengths, FLATTEN_MODES, CLIP_UNITS, DEFAULT_TOLERANCE, SHAPE_TAGS
+from claude import iter_svg_elements, element_to_path, path_to_polyline, find_bounding_box, normalize_polylines
+from svp import SVPWriter
+from consts import placeholder_note, track_name
+from simplify import SIMPLIFY_MODES, simplify_mask
+from stitch import chain_polylines
+from preview import preview_controls
+from cache import PolylineCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE
 
 TINY_WIGGLE = 10000000 * 0.3
 BLICK = 705600000 # 1 quarter note in Blicks
 
 SEG_MERGE_SLOPE_TOLERANCE = 0.1
 
-def main():
-    # By default you specify input file, and output file will be that file but with '.svp' extension
-    # By default we jam the entire svg into one bar and one octave, you can specify how many semitones and bars you want
+# Units of --precision and --tolerance: SVG user units, or the quarter notes and semitones of the output
+PRECISION_UNITS = ('svg', 'output')
 
-    parser = argparse.ArgumentParser(description='Convert SVG files to SVP format.', add_help=False) # Stupid help conflicts with height
-    parser.add_argument('input', type=str, help='Input SVG file')
-    parser.add_argument('output', type=str, nargs='?', help='Output SVP file (default: input file with .svp extension)')
+# Sampling densities searched by --max-points/--max-controls; density is --precision, or 1/--tolerance when adaptive
+MIN_DENSITY = 1e-3
+MAX_DENSITY = 1e3
+BUDGET_SEARCH_STEPS = 16
+
+def parse_window(text):
+    """argparse type for --clip: four comma separated numbers x0,y0,x1,y1"""
+    try:
+        window = tuple(float(value) for value in text.split(','))
+    except ValueError:
+        window = ()
+    if len(window) != 4:
+        raise argparse.ArgumentTypeError(f"expected x0,y0,x1,y1, got '{text}'")
+    return window
+
+def positive_float(text):
+    """argparse type for tolerances and sizes that must be greater than zero"""
+    try:
+        value = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a number, got '{text}'")
+    if not value > 0:
+        raise argparse.ArgumentTypeError(f"must be greater than 0, got '{text}'")
+    return value
+
+def non_negative_int(text):
+    """argparse type for counts such as decimal places that may be zero but not negative"""
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a whole number, got '{text}'")
+    if value < 0:
+        raise argparse.ArgumentTypeError(f"must not be negative, got '{text}'")
+    return value
+
+def add_conversion_arguments(parser):
     parser.add_argument('--width', '-w', type=float, default=4.0, help='Number of quarter notes wide (default: 4)')
     parser.add_argument('--height', '-h', type=float, default=12.0, help='Number of semitones tall (default: 12)')
     parser.add_argument('-x', type=float, default=2.0, help='Starting X position, in quarter notes (default: 2)')
     parser.add_argument('-y', type=float, default=48.0, help='Starting Y position, in MIDI note IDs (default: 48)')
     parser.add_argument('--precision', '-p', type=float, default=1.0, help='Polyline precision (LOWER values = more points)')
+    parser.add_argument('--flatten', choices=FLATTEN_MODES, default='uniform', help='Curve flattening mode (default: uniform)')
+    parser.add_argument('--tolerance', '-t', type=float, default=DEFAULT_TOLERANCE, help='Maximum chord deviation in SVG units for --flatten adaptive')
+    parser.add_argument('--precision-units', choices=PRECISION_UNITS, default='svg',
+                        help='svg: --precision is points per SVG unit and --tolerance in SVG units; '
+                             'output: both per quarter note horizontally and per semitone vertically (default: svg)')
+    parser.add_argument('--simplify', choices=SIMPLIFY_MODES, default='none', help='Point reduction before splitting (default: none)')
+    parser.add_argument('--simplify-cents', type=positive_float, default=2.0, help='Pitch tolerance for --simplify, in cents (default: 2)')
+    parser.add_argument('--simplify-blicks', type=positive_float, default=TINY_WIGGLE, help=f'Time tolerance for --simplify, in blicks (default: {TINY_WIGGLE:.0f})')
+    parser.add_argument('--stitch', action='store_true', help='Join polylines whose ends meet into longer ones before splitting')
+    parser.add_argument('--stitch-cents', type=positive_float, default=2.0, help='Pitch distance between ends joined by --stitch, in cents (default: 2)')
+    parser.add_argument('--stitch-blicks', type=positive_float, default=TINY_WIGGLE, help=f'Time distance between ends joined by --stitch, in blicks (default: {TINY_WIGGLE:.0f})')
+    parser.add_argument('--clip', type=parse_window, metavar='X0,Y0,X1,Y1', help='Only convert what lies inside this window, see --clip-units')
+    parser.add_argument('--clip-units', choices=CLIP_UNITS, default='normalized',
+                        help='normalized: fractions of the drawing, Y growing upwards; svg: SVG user units (default: normalized)')
+    parser.add_argument('--partition-by', type=positive_float, help='Put every window of this many quarter notes into its own note group')
+    parser.add_argument('--decimals', type=non_negative_int, default=4, help='Decimal places kept for pitch values (default: 4)')
+    parser.add_argument('--time-decimals', type=non_negative_int, default=0, help='Decimal places kept for time values in blicks (default: 0)')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR, help=f'Where sampled polylines are cached (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--cache-size', type=float, default=DEFAULT_CACHE_SIZE / 1024 / 1024, help='Cache size limit in MiB (default: 256)')
+    parser.add_argument('--no-cache', action='store_true', help='Always re-sample the SVG, without reading or writing the cache')
     parser.add_argument('--force', '-f', action='store_true', help='Overwrite output file if it exists')
     parser.add_argument('--help', action='help', default=argparse.SUPPRESS, help='show this help message and exit')
+
+def _slope(x, y, i, j):
+    dx = x[j] - x[i]
+    ret = (y[j] - y[i]) / dx if dx != 0 else 1e-5
+    return ret if ret != 0 else 1e-5
+
+def _finish_segment(segments, x, y, current, wiggle):
+    # Appends a finished segment, merging it into a chord or into the previous segment when they are close to straight
+    # If all parts of a segment has a similar slope, its X delta is less than 5*TINY_WIGGLE, and has <= 5 points
+    # we connect the head and tail of the segment to form a single segment
+    if 2 < len(current) <= 5:
+        total_slope = _slope(x, y, current[0], current[-1])
+        good_for_merge = all(abs(_slope(x, y, current[i], current[i + 1]) / total_slope - 1) <= SEG_MERGE_SLOPE_TOLERANCE
+                             for i in range(len(current) - 1))
+        # Check if the X delta is less than 5*TINY_WIGGLE
+        if good_for_merge and abs(x[current[-1]] - x[current[0]]) < 5 * wiggle:
+            segments.append([current[0], current[-1]])
+            return
+
+    # If the current and last segment are both 2-point-segments, merging results in similar slopes
+    # and the X delta is less than 3*TINY_WIGGLE, we merge them
+    if len(segments) > 0 and len(current) == 2 and len(segments[-1]) == 2:
+        last = segments[-1]
+        slope_last = _slope(x, y, last[0], last[1])
+        slope_current = _slope(x, y, current[0], current[1])
+        slope_total = _slope(x, y, last[0], current[1])
+        if abs(slope_last / slope_current - 1) < SEG_MERGE_SLOPE_TOLERANCE and \
+            abs(slope_total / slope_current - 1) < SEG_MERGE_SLOPE_TOLERANCE and \
+            abs(x[current[1]] - x[last[0]]) < 3 * wiggle:
+            segments[-1] = [last[0], current[1]]
+            return
+        # We also check with a much stricter tolerance (5%) and doesn't limit the X delta to 3*TINY_WIGGLE
+        elif abs(slope_last - slope_current) < min(0.05, SEG_MERGE_SLOPE_TOLERANCE):
+            segments[-1] = [last[0], current[1]]
+            return
+
+    segments.append(current)
+
+def split_polyline(points, tiny_wiggle):
+    """Split an (N, 2) normalized polyline into segments whose X value increases monotonically
+
+    Returns one list of indices into points per segment. Runs of tiny X wiggles collapse into a
+    single chord, and nearly straight short segments are merged (see SEG_MERGE_SLOPE_TOLERANCE).
+    The loop runs over plain floats, which is cheaper than NumPy calls for the few points most segments have.
+    """
+    x = points[:, 0].tolist()
+    y = points[:, 1].tolist()
+    wiggle = tiny_wiggle / BLICK
+
+    segments = []
+    ref_x = x[0]
+    current = [0]
+    maximum_wiggle = 0
+    merged_wiggle = False
+    for i in range(1, len(x)):
+        maximum_wiggle = max(maximum_wiggle, abs(x[i] - ref_x))
+        # If X wiggle is really small, we discard everything except the first point
+        # and append the current point after (so we essentially merge the wiggle segments)
+        if maximum_wiggle < wiggle:
+            current = [current[0], i]
+            merged_wiggle = True
+        # Otherwise, X must keep increasing
+        # If we get here after merging tiny wiggles, the merged chord is a segment of its own
+        elif x[i] >= x[current[-1]]:
+            if merged_wiggle:
+                _finish_segment(segments, x, y, [current[0], i], wiggle)
+                ref_x, maximum_wiggle, merged_wiggle = x[i], 0, False
+                current = []
+            current.append(i)
+        # If all above fails, the point where X goes backwards ends the segment and starts the next
+        else:
+            current.append(i)
+            _finish_segment(segments, x, y, current, wiggle)
+            ref_x, maximum_wiggle, merged_wiggle = x[i], 0, False
+            current = [i]
+    segments.append(current)
+
+    return segments
+
+def tolerance_scale(args, blicks, cents):
+    # Scale from normalized coordinates to output units in which a time of blicks and a pitch of cents both become 1
+    return np.array([args.width * BLICK / blicks, args.height * 100 / cents])
+
+def simplify_polylines(polylines, args):
+    """Reduce points within --simplify-cents/--simplify-blicks of the output curve, returning (polylines, points removed)"""
+    if args.simplify == 'none':
+        return polylines, 0
+
+    scale = tolerance_scale(args, args.simplify_blicks, args.simplify_cents)
+    polylines = as_polyline_set(polylines)
+    if len(polylines) == 0:
+        return polylines, 0
+    mask = np.concatenate([simplify_mask(points, 1.0, args.simplify)
+                           for points in polylines.with_points(polylines.points * scale)])
+    return polylines.select(mask), len(mask) - int(mask.sum())
+
+def stitch_polylines(polylines, args):
+    """Join polylines whose ends meet within --stitch-cents/--stitch-blicks, returning (polylines, joins made)"""
+    polylines = as_polyline_set(polylines)
+    if not args.stitch or len(polylines) < 2:
+        return polylines, 0
+
+    scale = tolerance_scale(args, args.stitch_blicks, args.stitch_cents)
+    chains = chain_polylines(polylines.with_points(polylines.points * scale), 1.0)
+    joined = []
+    for chain in chains:
+        pieces = []
+        for index, reverse in chain:
+            points = polylines[index][::-1] if reverse else polylines[index]
+            if pieces and np.array_equal(pieces[-1][-1], points[0]):
+                points = points[1:] # Shared endpoint
+            pieces.append(points)
+        joined.append(np.concatenate(pieces))
+    return PolylineSet.from_arrays(joined), len(polylines) - len(chains)
+
+def stream_controls(polylines, args, x):
+    """Pitch controls of normalized polylines that arrive one at a time, each simplified on its own"""
+    for points in polylines:
+        simplified, _ = simplify_polylines([points], args)
+        yield from pitch_controls(simplified, args, x)
+
+def prepare_polylines(polylines, args):
+    """Simplify and stitch normalized polylines, as every conversion does right before splitting"""
+    polylines, _ = simplify_polylines(polylines, args)
+    polylines, _ = stitch_polylines(polylines, args)
+    return polylines
+
+def default_output(input_file):
+    return input_file.rsplit('.', 1)[0] + '.svp'
+
+def convert_coords(points, args, x):
+    """Convert normalized (N, 2) points to SVP coordinates (blicks, MIDI note IDs), starting x quarter notes in"""
+    converted = np.empty_like(points)
+    converted[:, 0] = ((points[:, 0] * args.width) + x) * BLICK # Blicks
+    converted[:, 1] = (points[:, 1] * args.height) + args.y
+    return converted
+
+def pitch_controls(polylines, args, x):
+    """Turn normalized polylines into (pos, pitch, points) pitch controls, starting x quarter notes in"""
+
+    # Scale up/down the tiny wiggle if width is not default value
+    tiny_wiggle = TINY_WIGGLE
+    if args.width != 4.0:
+        tiny_wiggle /= (args.width / 4.0)
+
+    polylines = as_polyline_set(polylines)
+    converted = polylines.with_points(convert_coords(polylines.points, args, x))
+
+    # For each polyline: We break each polyline into small segments whose X value increases monotonically
+    # and turn them into individual pitch control lines.
+    for points, svp_points in zip(polylines, converted):
+        # Split the polyline into segments
+        segments = split_polyline(points, tiny_wiggle)
+
+        # Make each segment a separate pitch control line
+        for indices in segments:
+            segment = svp_points[indices]
+            # The first point (origin) is the pitch control's position
+            origin = segment[0]
+
+            # Note that to avoid near vertical segments (they will not be rendered in the software),
+            # When the polyline contains only 2 points, we detect if this is a near vertical segment
+            # and we add a tiny wiggle to the second point to make it horizontal.
+            if len(segment) == 2 and abs(segment[1, 0] - origin[0]) < tiny_wiggle:
+                segment[1, 0] = origin[0] + tiny_wiggle
+
+            # Relative coordinate to the origin is used as the pitch control line's point coordinates
+            relative = segment[1:] - origin
+            yield float(origin[0]), float(origin[1]), [0, 0] + relative.ravel().tolist()
+
+def control_batches(polylines, args, x):
+    """Pitch controls as (start in blicks, controls) batches, as write_controls takes them
+
+    Without --partition-by everything is one batch in document order. With it every polyline is a batch of its own,
+    ordered by where it starts, so partition_controls can finish each window as soon as no later polyline reaches it.
+    """
+    polylines = as_polyline_set(polylines)
+    if not args.partition_by:
+        return [(None, pitch_controls(polylines, args, x))]
+    starts = [((points[:, 0].min() * args.width) + x) * BLICK for points in polylines]
+    return [(starts[i], pitch_controls([polylines[i]], args, x)) for i in np.argsort(starts, kind='stable')]
+
+def _clipped_control(cell, piece):
+    # Turns a piece of an absolute (N, 2) pitch curve back into a pitch control, if anything is left of it
+    points = np.array(piece)
+    points = points[np.r_[True, np.any(points[1:] != points[:-1], axis=1)]]
+    if len(points) < 2:
+        return []
+    origin = points[0]
+    return [(cell, (float(origin[0]), float(origin[1]), [0, 0] + (points[1:] - origin).ravel().tolist()))]
+
+def clip_control(control, window):
+    """Cut a pitch control at every multiple of window blicks it crosses, returning (window index, control) pieces"""
+    pos, pitch, points = control
+    absolute = np.array(points, dtype=float).reshape(-1, 2) + (pos, pitch)
+    cells = np.floor(absolute[:, 0] / window).astype(np.int64)
+    if (cells == cells[0]).all():
+        return [(int(cells[0]), control)]
+
+    pieces = []
+    cell = int(cells[0])
+    piece = [absolute[0]]
+    for i in range(1, len(absolute)):
+        a, b = absolute[i - 1], absolute[i]
+        while cell != cells[i]:
+            # Interpolate the point on the window boundary, which ends this piece and starts the next
+            step = 1 if cells[i] > cell else -1
+            boundary = (cell + (step > 0)) * window
+            cut = a + (b - a) * ((boundary - a[0]) / (b[0] - a[0]))
+            cut[0] = boundary
+            piece.append(cut)
+            pieces += _clipped_control(cell, piece)
+            piece = [cut]
+            cell += step
+        piece.append(b)
+    return pieces + _clipped_control(cell, piece)
+
+def partition_controls(batches, window):
+    """Bucket pitch controls into windows of window blicks, yielding (window index, controls sorted by position)
+
+    batches are (start, controls) pairs in increasing start order, with no control beginning before its start
+    (None if unknown); every window that ends before the next batch starts is complete and is yielded right away.
+    """
+    pending = defaultdict(list)
+
+    def complete(limit):
+        for cell in sorted(cell for cell in pending if limit is None or (cell + 1) * window <= limit):
+            yield cell, sorted(pending.pop(cell), key=lambda control: control[0])
+
+    for start, controls in batches:
+        if start is not None:
+            yield from complete(start)
+        for control in controls:
+            for cell, piece in clip_control(control, window):
+                pending[cell].append(piece)
+    yield from complete(None)
+
+def write_controls(f, batches, args):
+    """Write (start, controls) batches as a complete SVP project into an open text file, returning how many controls were written
+
+    With --partition-by every window becomes a note group of its own, with its own placeholder note.
+    """
+    with SVPWriter(f, args.time_decimals, args.decimals) as writer:
+        if args.partition_by:
+            window = args.partition_by * BLICK
+            for number, (cell, controls) in enumerate(partition_controls(batches, window), start=1):
+                # Whole blicks, like everything else in the project, even for fractional --partition-by
+                begin, end = round(cell * window), round((cell + 1) * window)
+                note = dict(placeholder_note, onset=begin, duration=min(end - begin, BLICK))
+                writer.begin_group(begin, end, f"{track_name} {number}", [note])
+                for pos, pitch, points in controls:
+                    writer.write_pitch_control(pos, pitch, points)
+        else:
+            for _, controls in batches:
+                for pos, pitch, points in controls:
+                    writer.write_pitch_control(pos, pitch, points)
+    return writer.pitch_controls
+
+def write_svp(output_file, batches, args):
+    """Write (start, controls) batches into a new SVP project, returning how many pitch controls were written"""
+    with open(output_file, 'w', encoding='utf-8') as f:
+        return write_controls(f, batches, args)
+
+def output_size(args):
+    # What Pipeline(output_size=...) takes: the quarter notes and semitones the drawing fills, if sampling is measured there
+    return (args.width, args.height) if args.precision_units == 'output' else None
+
+def sample_svg(input_file, args, stats=None):
+    cache = None if args.no_cache else PolylineCache(args.cache_dir, int(args.cache_size * 1024 * 1024))
+    return Pipeline(args.precision, args.flatten, args.tolerance, cache, stats, args.clip, args.clip_units,
+                    output_size(args)).run(input_file)
+
+def fit_budget(input_file, args, stats=None):
+    """Sample with the highest density whose output fits --max-points/--max-controls, returning (result, density)
+
+    The SVG is parsed and every segment measured once; each attempt only re-samples, splits and counts.
+    The density given on the command line is where the search starts.
+    """
+    pipeline = Pipeline(args.precision, args.flatten, args.tolerance, stats=stats, clip=args.clip, clip_units=args.clip_units,
+                        output_size=output_size(args))
+    paths, width, height = pipeline.extract(input_file)
+    full_box = window = None
+    if args.clip is not None:
+        paths, full_box, window = pipeline.cull(paths)
+    elif pipeline.output_size is not None:
+        _, full_box = pipeline.index(paths)
+    scale = None if full_box is None else pipeline.scale(full_box)
+    with (stats.stage('measure') if stats is not None else nullcontext()):
+        lengths = [segment_lengths(path, scale) for path in paths] if args.flatten != 'adaptive' else None
+
+    attempts = {}
+    def attempt(density):
+        if density not in attempts:
+            if args.flatten != 'adaptive':
+                probe = Pipeline(density, args.flatten)
+            else:
+                probe = Pipeline(args.precision, args.flatten, 1 / density)
+            polylines = probe.sample(paths, lengths, window, scale)
+            bounding_box, normalized = probe.normalize(polylines, full_box)
+            controls = points = 0
+            for _, _, control_points in pitch_controls(prepare_polylines(normalized, args), args, args.x):
+                controls += 1
+                points += len(control_points) // 2
+            fits = ((args.max_points is None or points <= args.max_points) and
+                    (args.max_controls is None or controls <= args.max_controls))
+            attempts[density] = (fits, points, controls, polylines, bounding_box, normalized)
+        return attempts[density][0]
+
+    with (stats.stage('budget') if stats is not None else nullcontext()):
+        low = high = min(max(args.precision if args.flatten != 'adaptive' else 1 / args.tolerance, MIN_DENSITY), MAX_DENSITY)
+        # Bracket the largest fitting density by factors of 4, then bisect in log space
+        if attempt(high):
+            # Merging collinear points makes the output level off, so stop once more density adds no points
+            low = high
+            while high < MAX_DENSITY:
+                high = min(high * 4, MAX_DENSITY)
+                if not attempt(high):
+                    break
+                if attempts[high][1] <= attempts[low][1] * 1.01:
+                    high = low
+                    break
+                low = high
+        else:
+            while low > MIN_DENSITY and not attempt(max(low / 4, MIN_DENSITY)):
+                low = max(low / 4, MIN_DENSITY)
+            high = low
+            low = max(low / 4, MIN_DENSITY)
+        if attempt(low):
+            for _ in range(BUDGET_SEARCH_STEPS):
+                if high / low < 1.01:
+                    break
+                middle = math.sqrt(low * high)
+                if attempt(middle):
+                    low = middle
+                else:
+                    high = middle
+        else:
+            print("Warning: even the lowest sampling density does not fit the point budget, try --simplify")
+
+    _, points, controls, polylines, bounding_box, normalized = attempts[low]
+    if stats is not None:
+        stats.add('budget.attempts', len(attempts))
+        stats.add('points.sampled', len(polylines.points))
+    print(f"Point budget: chose {'precision' if args.flatten != 'adaptive' else 'tolerance'} "
+          f"{low if args.flatten != 'adaptive' else 1 / low:.6g} ({points} points, {controls} pitch controls)")
+    return ConversionResult(input_file, width, height, paths, polylines, bounding_box, normalized), low
+
+def collected_controls(controls, collection):
+    # Keeps a copy of every pitch control on its way to the writer, for the preview
+    for control in controls:
+        collection.append(control)
+        yield control
+
+def counted_controls(controls, stats):
+    # Counts pitch controls and their points on their way to the writer
+    for control in controls:
+        stats.add('pitch_controls')
+        stats.add('points.split', len(control[2]) // 2)
+        yield control
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        return batch_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        return serve_main(sys.argv[2:])
+
+    # By default you specify input file, and output file will be that file but with '.svp' extension
+    # By default we jam the entire svg into one bar and one octave, you can specify how many semitones and bars you want
+
+    parser = argparse.ArgumentParser(description='Convert SVG files to SVP format. '
+                                     'Run "main.py batch --help" for batch conversion, "main.py serve --help" for the conversion daemon.',
+                                     add_help=False) # Stupid help conflicts with height
+    parser.add_argument('input', type=str, help='Input SVG file')
+    parser.add_argument('output', type=str, nargs='?', help='Output SVP file (default: input file with .svp extension)')
+    add_conversion_arguments(parser)
+    parser.add_argument('--stats', action='store_true', help='Print stage timings, peak memory and point/segment counts')
+    parser.add_argument('--stats-json', type=str, help='Write the same statistics to a JSON file')
+    parser.add_argument('--watch', action='store_true', help='Keep running and re-convert the changed shapes whenever the input is saved')
+    parser.add_argument('--watch-interval', type=float, default=0.2, help='Seconds between checks for changes in --watch mode (default: 0.2)')
+    parser.add_argument('--max-points', type=int, help='Pick the sampling density automatically so the output has at most this many points')
+    parser.add_argument('--max-controls', type=int, help='Pick the sampling density automatically so the output has at most this many pitch controls')
+    parser.add_argument('--stream', action='store_true', help='Read the SVG twice but hold only one path in memory at a time, for huge drawings')
+    parser.add_argument('--preview', action='store_true', help='Show the split pitch controls in a window after converting (needs matplotlib)')
+    parser.add_argument('--preview-png', type=str, help='Save a picture of the split pitch controls to this PNG file, without a display')
     args = parser.parse_args()
+    if args.stream and (args.stitch or args.watch or args.max_points is not None or args.max_controls is not None):
+        parser.error("--stream cannot be combined with --stitch, --watch, --max-points or --max-controls")
 
     input_file = args.input
-    output_file = args.output if args.output else input_file.rsplit('.', 1)[0] + '.svp'
+    output_file = args.output if args.output else default_output(input_file)
 
     # If output file exists, warn the user and ask for confirmation to overwrite
     if not args.force and os.path.exists(output_file):
         print(f"Output file '{output_file}' already exists. Use -f to overwrite.")
         sys.exit(1)
 
+    if args.watch:
+        return watch(input_file, output_file, args)
+
+    stats = PipelineStats() if args.stats or args.stats_json else None
+    stage = stats.stage if stats is not None else lambda name: nullcontext()
+
     print("Sampling SVG into polylines...")
-    polylines: list[(float, float)] = get_normalized_polylines(input_file, args.precision)
+    if args.stream:
+        # Paths are sampled, simplified and split one at a time while writing
+        polylines, bounding_box, _, _ = Pipeline(args.precision, args.flatten, args.tolerance, stats=stats,
+                                                     clip=args.clip, clip_units=args.clip_units,
+                                                     output_size=output_size(args)).stream(input_file)
+        print(f"Bounding box: {bounding_box}")
+        print("Begin processing SVG to SVP...")
+        batches = [(None, stream_controls(polylines, args, args.x))]
+    else:
+        if args.max_points is not None or args.max_controls is not None:
+            result, _ = fit_budget(input_file, args, stats)
+        else:
+            result = sample_svg(input_file, args, stats)
+        if result.from_cache:
+            print("Reused cached polylines")
+        print(f"Bounding box: {result.bounding_box}")
 
-    # Scale up/down the tiny wiggle if width is not default value
-    if args.width != 4.0:
-        global TINY_WIGGLE
-        TINY_WIGGLE /= (args.width / 4.0)
-
-    # Helper to convert normalized coordinates to SVP coordinates
-    def convert_coords(point):
-        x = ((point[0] * args.width) + args.x) * BLICK # Blicks
-        y = (point[1] * args.height) + args.y
-        return x, y
-    
-    # Helper to split a polyline into multiple segments that has a monotonically increasing x value
-    def split_polyline(polyline):
-        segments = []
-        ref_point = polyline[0]
-        current_segment = [ref_point]
-        maximum_wiggle = 0
-        merged_wiggle = False
-
-        def finish_current_segment(current_point):
-            # Finishes current segment and does some cleanup
-            nonlocal current_segment, merged_wiggle, maximum_wiggle, ref_point
-            merged_wiggle = False
-            maximum_wiggle = 0
-            ref_point = current_point
-
-            def slope(point1, point2):
-                ret = (point2[1] - point1[1]) / (point2[0] - point1[0]) if (point2[0] - point1[0]) != 0 else 1e-5
-                return ret if ret != 0 else 1e-5
-            
-            finished = False
-
-            # If all parts of a segment has a similar slope, its X delta is less than 5*TINY_WIGGLE, and has <= 5 points
-            # we connect the head and tail of the segment to form a single segment
-            if len(current_segment) > 2 and len(current_segment) <= 5:
-                good_for_merge = True
-                total_slope = slope(current_segment[0], current_segment[-1])
-                for i in range(len(current_segment) - 1):
-                    if abs(slope(current_segment[i], current_segment[i + 1]) / total_slope - 1) > SEG_MERGE_SLOPE_TOLERANCE:
-                        good_for_merge = False
-                        break
-                # Check if the X delta is less than5*TINY_WIGGLE
-                if good_for_merge and abs(current_segment[-1][0] - current_segment[0][0]) < (5 * TINY_WIGGLE / BLICK):
-                    segments.append([current_segment[0], current_segment[-1]])
-                    finished = True
-
-            # If the current and last segment are both 2-point-segments, merging results in similar slopes
-            # and the X delta is less than 3*TINY_WIGGLE, we merge them
-            if len(segments) > 0 and len(current_segment) == 2 and len(segments[-1]) == 2:
-                slope_last = slope(segments[-1][0], segments[-1][1])
-                slope_current = slope(current_segment[0], current_segment[1])
-                slope_total = slope(segments[-1][0], current_segment[1])
-                if abs(slope_last / slope_current - 1) < SEG_MERGE_SLOPE_TOLERANCE and \
-                    abs(slope_total / slope_current - 1) < SEG_MERGE_SLOPE_TOLERANCE and \
-                    abs(current_segment[1][0] - segments[-1][0][0]) < (3 * TINY_WIGGLE / BLICK):
-                    segments[-1][1] = current_segment[1]
-                    finished = True
-                # We also check with a much stricter tolerance (5%) and doesn't limit the X delta to 3*TINY_WIGGLE
-                elif abs(slope_last - slope_current) < min(0.05, SEG_MERGE_SLOPE_TOLERANCE):
-                    segments[-1][1] = current_segment[1]
-                    finished = True
-
-            if not finished:
-                segments.append(current_segment)
-
-            current_segment = [current_point]
-
-            # Visualize all segments with matplotlit
-            if False:
-                import matplotlib.pyplot as plt
-                for segment in segments:
-                    x_coords = [convert_coords(point)[0] for point in segment]
-                    y_coords = [convert_coords(point)[1] for point in segment]
-                    plt.plot(x_coords, y_coords, marker='o')
-                plt.title('Segmented Polylines')
-                plt.xlabel('X (Blicks)')
-                plt.ylabel('Y (MIDI note IDs)')
-                plt.grid()
-                plt.show()
-
-        for point in polyline[1:]:
-            x_wiggle = abs(point[0] - ref_point[0])
-            maximum_wiggle = max(maximum_wiggle, x_wiggle)
-            # If X wiggle is really small, in this case, we discard everything except the first point
-            # and append the current point after (so we essentially merges the wiggle segments)
-            if maximum_wiggle < (TINY_WIGGLE / BLICK):
-                current_segment = [current_segment[0], point]
-                merged_wiggle = True
-            # Otherwise, must ensure x is monotonically increasing
-            # If we've met this condition after we've merged tiny wiggles, a new segment should be started
-            elif point[0] >= current_segment[-1][0]:
-                if merged_wiggle:
-                    current_segment = [current_segment[0], point]
-                    finish_current_segment(point)
-                    current_segment = [] # Current segment will be appended of the current point below, avoid repeating points
-                current_segment.append(point)
-            # If all above fails, we start a new segment
-            else:
-                current_segment.append(point)
-                finish_current_segment(point)
-        segments.append(current_segment)
-
-        # print(f"Segmented polyline into {len(segments)} segments")
-        return segments
-    
-    # Write the SVP file
-    pitch_id = 1000
-
-    print("Begin processing SVG to SVP...")
-    with open(output_file, 'w') as f:
-        notegroup_uuid = str(uuid.uuid4())
-        f.write(file_seg_before_uuid)
-        f.write(notegroup_uuid)
-        f.write(file_seg_after_uuid)
-
-        # For each polyline: We break each polyline into small segments whose X value increases monotonically
-        # and write them as individual pitch control lines.
-
-        polyline_data = ''
-        for polyline in polylines:
-            # Split the polyline into segments
-            segments = split_polyline(polyline)
-
-            # Make each segment a separate pitch control line
-            for segment in segments:
-                # Determine the origin
-                origin = segment[0]
-                origin_converted = convert_coords(origin)
-
-                # Write the first point (origin) in the polyline
-                polyline_data += (file_seg_pitch_ctrl_meta.format(origin_converted[0], origin_converted[1], pitch_id))
-                pitch_id += 1
-
-                # Write the rest of the points (segments) in the polyline
-                # Note that to avoid near vertical segments (they will not be rendered in the software),
-                # When the polyline contains only 2 points, we detect if this is a near vertical segment
-                # and we add a tiny wiggle to the second point to make it horizontal.
-                last_point_converted = origin_converted
-                polyline_coords = [0, 0]
-                for point in segment[1:]:
-                    point_converted = convert_coords(point)
-
-                    # Minimum X wiggle detection
-                    if len(segment) == 2 and (abs(point_converted[0] - last_point_converted[0]) < TINY_WIGGLE):
-                        point_converted = (last_point_converted[0] + TINY_WIGGLE, point_converted[1])
-
-                    # Relative coordinate to the origin is used as the pitch control line's point coordinates
-                    polyline_coords.append(point_converted[0] - origin_converted[0])
-                    polyline_coords.append(point_converted[1] - origin_converted[1])
-                
-                polyline_data += str(polyline_coords) + file_seg_pitch_ctrl_end + ','
-        
-        # Remove the last comma
-        polyline_data = polyline_data[:-1]
-        f.write(polyline_data)
-
-        main_group_uuid = str(uuid.uuid4())
-        f.write(file_seg_end_before_main_group_uuid1)
-        f.write(main_group_uuid)
-        f.write(file_seg_end_after_main_group_uuid1)
-        f.write(file_seg_end_before_main_group_uuid2)
-        f.write(main_group_uuid)
-        f.write(file_seg_end_after_main_group_uuid2)
-
-        f.write(file_seg_end_before_group_uuid)
-        f.write(notegroup_uuid)
-        f.write(file_seg_end_after_group_uuid)
+        with stage('simplify'):
+            polylines, removed = simplify_polylines(result.normalized_polylines, args)
+        if args.simplify != 'none':
+            total = len(result.normalized_polylines.points)
+            print(f"Simplified polylines: removed {removed} of {total} points")
+        with stage('stitch'):
+            polylines, joins = stitch_polylines(polylines, args)
+        if args.stitch:
+            print(f"Stitched polylines: {joins} joins, {len(polylines)} polylines left")
+
+        # Write the SVP file
+        print("Begin processing SVG to SVP...")
+        batches = control_batches(polylines, args, args.x)
+        if stats is not None:
+            stats.add('points.simplified', len(polylines.points))
+
+    preview = [] if args.preview or args.preview_png else None
+    if preview is not None:
+        batches = [(start, collected_controls(controls, preview)) for start, controls in batches]
+    if stats is not None:
+        # Splitting happens lazily while writing, so its time is split out of the write stage
+        batches = [(start, counted_controls(stats.timed('split', controls), stats)) for start, controls in batches]
+    with stage('write'):
+        write_svp(output_file, batches, args)
+    split = stats.stages.get('split') if stats is not None else None
+    if split is not None:
+        # Both timers only start once controls are pulled, so they are missing when nothing was drawn
+        stats.stages['write']['seconds'] -= split['seconds']
+        if args.stream and 'sample' in stats.stages:
+            split['seconds'] -= stats.stages['sample']['seconds']
 
     print(f"Converted '{input_file}' to '{output_file}' successfully.")
 
+    if stats is not None:
+        if stats.counters.get('pitch_controls'):
+            stats.counters['points_per_control'] = stats.counters['points.split'] / stats.counters['pitch_controls']
+        stats.add('bytes_written', os.path.getsize(output_file))
+        if args.stats:
+            print(stats.format())
+        if args.stats_json:
+            with open(args.stats_json, 'w') as f:
+                json.dump(stats.as_dict(), f, indent=2)
+
+    if args.preview_png:
+        drawn = preview_controls(preview, BLICK, args.preview_png, f"Pitch controls - {os.path.basename(input_file)}")
+        print(f"Preview of {len(preview)} pitch controls ({drawn} points drawn) written to '{args.preview_png}'")
+    if args.preview:
+        preview_controls(preview, BLICK, title=f"Pitch controls - {os.path.basename(input_file)}")
+
+@dataclass
+class PathState:
+    polyline: np.ndarray    # Sampled points in SVG units, None if the shape produced nothing
+    bounding_box: tuple
+    controls: list = None   # Pitch controls, valid for the current global bounding box
+
+class IncrementalConverter:
+    """Converts the same SVG over and over, re-sampling and re-splitting only the shapes that changed
+
+    Shapes are identified by a hash of their tag and attributes. The global bounding box is kept up to date
+    from the per-shape boxes; only when it moves do the unchanged shapes need to be split again.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.paths = {}     # (digest, occurrence) -> PathState
+        self.order = []     # Keys in document order
+        self.bounding_box = None
+
+    def _sample(self, index, tag, attrib):
+        try:
+            path = element_to_path(tag, attrib)
+            if path is None:
+                # Missing the attributes that make it a shape, skipped silently like run() does
+                return PathState(None, None)
+            polyline = path_to_polyline(path, self.args.precision, self.args.flatten, self.args.tolerance)
+        except Exception as e:
+            print(f"Error processing path #{index}: {e}")
+            return PathState(None, None)
+        if not len(polyline):
+            return PathState(None, None)
+        return PathState(polyline, find_bounding_box([polyline]))
+
+    def _updated_bounding_box(self, paths, removed, added):
+        bbox = self.bounding_box
+        removed_boxes = [state.bounding_box for state in removed if state.polyline is not None]
+        if bbox is None or any(b[0] <= bbox[0] or b[1] <= bbox[1] or b[2] >= bbox[2] or b[3] >= bbox[3] for b in removed_boxes):
+            # A path on the edge of the drawing changed: rebuild from the per-path boxes
+            boxes = np.array([state.bounding_box for state in paths.values() if state.polyline is not None])
+            if len(boxes) == 0:
+                return (0, 0, 1, 1)  # Default bounding box
+            return (float(boxes[:, 0].min()), float(boxes[:, 1].min()), float(boxes[:, 2].max()), float(boxes[:, 3].max()))
+
+        for b in (state.bounding_box for state in added if state.polyline is not None):
+            bbox = (min(bbox[0], b[0]), min(bbox[1], b[1]), max(bbox[2], b[2]), max(bbox[3], b[3]))
+        return bbox
+
+    def update(self, svg_file):
+        """Re-read the SVG, returning how many shapes had to be re-sampled"""
+        elements, _, _ = iter_svg_elements(svg_file)
+        paths = {}
+        order = []
+        occurrences = {}
+        added = []
+        for tag, attrib in elements:
+            if tag not in SHAPE_TAGS:
+                continue
+            digest = hashlib.blake2b(repr((tag, sorted(attrib.items()))).encode(), digest_size=16).digest()
+            # Identical shapes appearing more than once each get their own entry
+            key = (digest, occurrences.get(digest, 0))
+            occurrences[digest] = key[1] + 1
+
+            state = self.paths.get(key)
+            if state is None:
+                state = self._sample(len(order), tag, attrib)
+                added.append(state)
+            paths[key] = state
+            order.append(key)
+
+        removed = [state for key, state in self.paths.items() if key not in paths]
+        bounding_box = self._updated_bounding_box(paths, removed, added)
+        if bounding_box != self.bounding_box:
+            for state in paths.values():
+                state.controls = None
+
+        # Normalize and split whatever is new, or everything if the bounding box moved
+        for state in paths.values():
+            if state.controls is None:
+                if state.polyline is None:
+                    state.controls = []
+                    continue
+                polylines, _ = simplify_polylines(normalize_polylines([state.polyline], bounding_box), self.args)
+                state.controls = list(pitch_controls(polylines, self.args, self.args.x))
+
+        self.paths, self.order, self.bounding_box = paths, order, bounding_box
+        return len(added)
+
+    def write(self, output_file):
+        controls = (control for key in self.order for control in self.paths[key].controls)
+        return write_svp(output_file, [(None, controls)], self.args)
+
+def watch(input_file, output_file, args):
+    """Convert input_file every time it is saved, until interrupted"""
+    converter = IncrementalConverter(args)
+    last_mtime = None
+    if args.stitch:
+        print("Note: --stitch is ignored in --watch mode, every shape is converted on its own")
+    if args.clip is not None:
+        print("Note: --clip is ignored in --watch mode, every shape is converted")
+    if args.precision_units == 'output':
+        print("Note: --precision-units output is ignored in --watch mode, sampling is measured in SVG units")
+    print(f"Watching '{input_file}' for changes, press Ctrl+C to stop...")
+    try:
+        while True:
+            try:
+                mtime = os.stat(input_file).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None # Some editors replace the file on save
+            if mtime is not None and mtime != last_mtime:
+                last_mtime = mtime
+                started = time.perf_counter()
+                try:
+                    resampled = converter.update(input_file)
+                except (ParseError, OSError) as e:
+                    print(f"Could not read '{input_file}' ({e}), waiting for the next save...")
+                else:
+                    count = converter.write(output_file)
+                    print(f"Re-sampled {resampled} of {len(converter.order)} shapes, wrote {count} pitch controls "
+                          f"to '{output_file}' in {(time.perf_counter() - started) * 1000:.1f} ms")
+            time.sleep(args.watch_interval)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+
+def batch_inputs(pattern):
+    """Expand a directory or glob pattern into a sorted list of SVG files"""
+    if os.path.isdir(pattern):
+        return sorted(glob.glob(os.path.join(pattern, '*.svg')))
+    return sorted(glob.glob(pattern))
+
+def _convert_one(job):
+    # Runs in a worker process; never raises so one bad file doesn't sink the batch
+    input_file, output_file, args = job
+    started = time.perf_counter()
+    try:
+        polylines = prepare_polylines(sample_svg(input_file, args).normalized_polylines, args)
+        count = write_svp(output_file, control_batches(polylines, args, args.x), args)
+        return input_file, output_file, count, time.perf_counter() - started, None
+    except Exception as e:
+        return input_file, output_file, 0, time.perf_counter() - started, str(e)
+
+def _sample_one(job):
+    # Runs in a worker process; the pitch controls go back to the parent, which writes them in order
+    input_file, x, args = job
+    started = time.perf_counter()
+    try:
+        polylines = prepare_polylines(sample_svg(input_file, args).normalized_polylines, args)
+        controls = list(pitch_controls(polylines, args, x))
+        return input_file, controls, time.perf_counter() - started, None
+    except Exception as e:
+        return input_file, [], time.perf_counter() - started, str(e)
+
+def batch_main(argv):
+    parser = argparse.ArgumentParser(prog='main.py batch', description='Convert many SVG files to SVP format in parallel.',
+                                     add_help=False)
+    parser.add_argument('inputs', type=str, help='Directory of SVG files, or a glob pattern such as "frames/*.svg"')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count(), help='Number of worker processes (default: CPU count)')
+    parser.add_argument('--layout', choices=['separate', 'sequence'], default='separate',
+                        help='separate: one SVP next to each SVG; sequence: all SVGs one after another in a single SVP (default: separate)')
+    parser.add_argument('--gap', type=float, default=0.0, help='Quarter notes between SVGs in sequence layout (default: 0)')
+    parser.add_argument('--output', '-o', type=str, help='Output SVP file for sequence layout')
+    add_conversion_arguments(parser)
+    args = parser.parse_args(argv)
+
+    input_files = batch_inputs(args.inputs)
+    if not input_files:
+        print(f"No SVG files found for '{args.inputs}'.")
+        return 1
+    if args.layout == 'sequence':
+        if not args.output:
+            parser.error('--layout sequence needs --output')
+        if not args.force and os.path.exists(args.output):
+            print(f"Output file '{args.output}' already exists. Use -f to overwrite.")
+            return 1
+
+    converted = failed = 0
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        if args.layout == 'separate':
+            jobs = []
+            for input_file in input_files:
+                output_file = default_output(input_file)
+                if not args.force and os.path.exists(output_file):
+                    print(f"{input_file}: skipped, '{output_file}' already exists. Use -f to overwrite.")
+                    continue
+                jobs.append((input_file, output_file, args))
+
+            for input_file, output_file, count, seconds, error in executor.map(_convert_one, jobs):
+                if error:
+                    failed += 1
+                    print(f"{input_file}: FAILED after {seconds:.2f}s: {error}")
+                else:
+                    converted += 1
+                    print(f"{input_file} -> {output_file}: {count} pitch controls in {seconds:.2f}s")
+        else:
+            # Each SVG starts where the previous one ended
+            jobs = [(input_file, args.x + i * (args.width + args.gap), args) for i, input_file in enumerate(input_files)]
+
+            def all_batches():
+                nonlocal converted, failed
+                for (_, x, _), (input_file, controls, seconds, error) in zip(jobs, executor.map(_sample_one, jobs)):
+                    if error:
+                        failed += 1
+                        print(f"{input_file}: FAILED after {seconds:.2f}s: {error}")
+                    else:
+                        converted += 1
+                        print(f"{input_file}: {len(controls)} pitch controls in {seconds:.2f}s")
+                    yield x * BLICK, controls
+
+            count = write_svp(args.output, all_batches(), args)
+            print(f"Wrote {count} pitch controls to '{args.output}'")
+
+    print(f"Converted {converted} of {len(input_files)} files in {time.perf_counter() - started:.2f}s")
+    return 1 if failed else 0
+
+class ConversionServer:
+    """Answers JSON conversion requests, keeping recently sampled SVGs in memory between requests
+
+    A request is one JSON object with either "input" (an SVG path) or "svg" (inline SVG text), optionally
+    "output" (an SVP path to write; otherwise the SVP text is returned as "svp"), an "id" echoed back, and any
+    conversion option by its long name, e.g. {"input": "a.svg", "width": 8, "x": 4, "precision": 2}.
+    """
+
+    def __init__(self, defaults, memory_entries=32):
+        self.defaults = defaults
+        self.memory_entries = memory_entries
+        self.results = OrderedDict()   # (content digest, sampler settings) -> ConversionResult, least recent first
+        # Request values are checked by the same argparse actions as the command line options
+        parser = argparse.ArgumentParser(add_help=False)
+        add_conversion_arguments(parser)
+        self.options = {action.dest: action for action in parser._actions
+                        if action.dest not in ('help', 'cache_dir', 'cache_size', 'no_cache')}
+
+    def _value(self, name, action, value):
+        # A request value converted the way argparse converts the option's text; lists are joined by commas, as for --clip
+        if action.nargs == 0:
+            if not isinstance(value, bool):
+                raise ValueError(f"Option '{name}' must be true or false, got {json.dumps(value)}")
+            return value
+        if value is None and action.default is None:
+            return None
+        if isinstance(value, (bool, dict)) or value is None:
+            raise ValueError(f"Invalid value for option '{name}': {json.dumps(value)}")
+        text = ','.join(map(str, value)) if isinstance(value, list) else str(value)
+        try:
+            value = action.type(text) if action.type is not None else text
+        except (ValueError, TypeError, argparse.ArgumentTypeError) as e:
+            raise ValueError(f"Invalid value for option '{name}': {e}")
+        if action.choices is not None and value not in action.choices:
+            raise ValueError(f"Invalid value for option '{name}': {json.dumps(value)} (choose from {', '.join(action.choices)})")
+        return value
+
+    def _args(self, request):
+        args = argparse.Namespace(**vars(self.defaults))
+        for name, value in request.items():
+            if name in ('id', 'input', 'svg', 'output'):
+                continue
+            attribute = name.replace('-', '_')
+            if attribute not in self.options:
+                raise ValueError(f"Unknown option '{name}'")
+            setattr(args, attribute, self._value(name, self.options[attribute], value))
+        return args
+
+    def _sample(self, data, name, args):
+        pipeline = Pipeline(args.precision, args.flatten, args.tolerance, clip=args.clip, clip_units=args.clip_units,
+                            output_size=output_size(args))
+        key = (hashlib.sha256(data).digest(), json.dumps(pipeline.settings(), sort_keys=True))
+        result = self.results.get(key)
+        if result is None:
+            result = pipeline.run(io.BytesIO(data))
+            result.svg_file = name
+            self.results[key] = result
+            if len(self.results) > self.memory_entries:
+                self.results.popitem(last=False)
+        self.results.move_to_end(key)
+        return result
+
+    def handle(self, request):
+        started = time.perf_counter()
+        response = {'id': request.get('id')} if isinstance(request, dict) else {}
+        try:
+            if not isinstance(request, dict):
+                raise ValueError('Request must be a JSON object')
+            args = self._args(request)
+            if 'svg' in request:
+                data, name = request['svg'].encode('utf-8'), '<inline>'
+            elif 'input' in request:
+                with open(request['input'], 'rb') as f:
+                    data, name = f.read(), request['input']
+            else:
+                raise ValueError("Request needs 'input' or 'svg'")
+
+            result = self._sample(data, name, args)
+            polylines = prepare_polylines(result.normalized_polylines, args)
+            batches = control_batches(polylines, args, args.x)
+
+            output_file = request.get('output')
+            if output_file:
+                if not args.force and os.path.exists(output_file):
+                    raise ValueError(f"Output file '{output_file}' already exists, set \"force\": true to overwrite")
+                response['pitch_controls'] = write_svp(output_file, batches, args)
+                response['output'] = output_file
+            else:
+                buffer = io.StringIO()
+                response['pitch_controls'] = write_controls(buffer, batches, args)
+                response['svp'] = buffer.getvalue()
+            response['ok'] = True
+        except Exception as e:
+            response['ok'] = False
+            response['error'] = str(e)
+        response['seconds'] = time.perf_counter() - started
+        return response
+
+    def handle_line(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return {'ok': False, 'error': f'Invalid JSON: {e}'}
+        # Progress messages go to stderr so they never end up inside the protocol stream
+        with redirect_stdout(sys.stderr):
+            return self.handle(request)
+
+def serve_main(argv):
+    parser = argparse.ArgumentParser(prog='main.py serve', add_help=False,
+                                     description='Keep the converter loaded and answer JSON-lines conversion requests '
+                                                 'on stdin/stdout or a Unix socket. Conversion options set the defaults.')
+    parser.add_argument('--socket', type=str, help='Listen on this Unix socket path instead of stdin/stdout')
+    parser.add_argument('--memory-entries', type=int, default=32, help='Sampled SVGs kept in memory between requests (default: 32)')
+    add_conversion_arguments(parser)
+    args = parser.parse_args(argv)
+    server = ConversionServer(args, args.memory_entries)
+
+    if not args.socket:
+        for line in sys.stdin:
+            if line.strip():
+                print(json.dumps(server.handle_line(line), ensure_ascii=False), flush=True)
+        return 0
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                if line.strip():
+                    response = server.handle_line(line.decode('utf-8'))
+                    self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                    self.wfile.flush()
+
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+    print(f"Listening on '{args.socket}', press Ctrl+C to stop...", file=sys.stderr)
+    try:
+        with socketserver.UnixStreamServer(args.socket, Handler) as unix_server:
+            unix_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+    return 0
+
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,217 @@
+import re
+import numpy as np
+from svg.path import Path, Line, CubicBezier, QuadraticBezier, Arc
+from svg.path.path import Move, Close
+
+# Segment kinds of PathArrays
+MOVE, LINE, CLOSE, QUADRATIC, CUBIC, ARC = range(6)
+# Lookup table indexed by kind, cheaper than np.isin on the many short paths of a typical drawing
+IS_CURVED = np.array([False, False, False, True, True, True])
+
+NUMBER = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+_NUMBER_RE = re.compile(NUMBER)
+_COMMAND_RE = re.compile(r'([MmLlHhVvCcSsQqTtAaZz])([^MmLlHhVvCcSsQqTtAaZz]*)')
+# Arc flags are single digits that may be written without separators, as in "a5 5 0 0110 10"
+_ARC_RE = re.compile(rf'({NUMBER})[\s,]*({NUMBER})[\s,]*({NUMBER})[\s,]*([01])[\s,]*([01])[\s,]*({NUMBER})[\s,]*({NUMBER})')
+
+_COMMANDS = 'MmLlHhVvCcSsQqTtAaZz'
+_SEPARATORS = ' \t\r\n\f,'
+
+def parse_numbers(text):
+    """Every number in an attribute value, converted in bulk into a float array"""
+    return np.array(_NUMBER_RE.findall(text), dtype=float)
+
+def parse_points(text):
+    """Parse a polyline/polygon points attribute into an (N, 2) float array, dropping an unpaired trailing value"""
+    values = parse_numbers(text)
+    return values[:len(values) // 2 * 2].reshape(-1, 2)
+
+class PathArrays:
+    """A path as typed arrays: kinds (K,) and control points (K, 4, 2) ordered start, control1, control2, end
+
+    Lines and closes only use start and end (the controls repeat them), quadratics keep their control point in
+    control1, moves only their end. Arcs keep (rx, ry, rotation, large_arc, sweep) in arc_params, which is None
+    when there are no arcs. Iterating yields the equivalent svg.path segments, so anything written for a Path
+    keeps working, while the samplers take faster routes through the arrays.
+    """
+
+    def __init__(self, kinds, points, arc_params=None):
+        self.kinds = kinds
+        self.points = points
+        self.arc_params = arc_params
+        self._segments = {} # Index -> svg.path segment, built on first use
+
+    @classmethod
+    def from_points(cls, points, closed=False):
+        """Straight lines through an (N, 2) array of points, like a <polyline> or (closed) <polygon>"""
+        count = len(points)
+        kinds = np.full(count + closed, LINE, dtype=np.int8)
+        kinds[0] = MOVE
+        starts = np.concatenate([points[:1], points[:-1], points[-1:]]) if closed else np.concatenate([points[:1], points[:-1]])
+        ends = np.concatenate([points, points[:1]]) if closed else points
+        if closed:
+            kinds[-1] = CLOSE
+        return cls(kinds, np.stack([starts, starts, ends, ends], axis=1))
+
+    @property
+    def straight(self):
+        """True when the path has no curved segments"""
+        return not IS_CURVED[self.kinds].any()
+
+    def section(self, begin, end):
+        """Segments begin to end as a PathArrays of their own, led by a move to where they start"""
+        kinds, points = self.kinds[begin:end], self.points[begin:end]
+        arc_params = None if self.arc_params is None else self.arc_params[begin:end]
+        if kinds[0] != MOVE:
+            kinds = np.concatenate([np.array([MOVE], dtype=np.int8), kinds])
+            points = np.concatenate([np.broadcast_to(points[0, 0], (1, 4, 2)), points])
+            if arc_params is not None:
+                arc_params = np.concatenate([np.zeros((1, 5)), arc_params])
+        return PathArrays(kinds, points, arc_params)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def segment(self, i):
+        """The svg.path segment for index i"""
+        segment = self._segments.get(i)
+        if segment is None:
+            segment = self._segments[i] = self._build(i)
+        return segment
+
+    def _build(self, i):
+        kind = self.kinds[i]
+        start, control1, control2, end = (complex(x, y) for x, y in self.points[i].tolist())
+        if kind == MOVE:
+            return Move(end)
+        if kind == LINE:
+            return Line(start, end)
+        if kind == CLOSE:
+            return Close(start, end)
+        if kind == QUADRATIC:
+            return QuadraticBezier(start, control1, end)
+        if kind == CUBIC:
+            return CubicBezier(start, control1, control2, end)
+        rx, ry, rotation, large_arc, sweep = self.arc_params[i].tolist()
+        return Arc(start, complex(rx, ry), rotation, bool(large_arc), bool(sweep), end)
+
+    def __iter__(self):
+        return (self.segment(i) for i in range(len(self)))
+
+    def to_path(self):
+        return Path(*self)
+
+def parse_path_data(d):
+    """Parse an SVG path d attribute straight into PathArrays, with the same semantics as svg.path's parse_path
+
+    The numbers of each command are converted in one go, segments are collected as plain floats and turned
+    into arrays once at the end, so neither an intermediate string nor svg.path objects are built.
+    Malformed data that parse_path rejects, such as text before the first command or arc arguments that do not
+    make up whole arcs, raises ValueError.
+    """
+    kinds = []
+    coords = [] # start, control1, control2, end of every segment, flattened
+    arcs = {}
+    x = y = 0.0
+    start_x = start_y = 0.0
+    last_kind = None
+    last_cx = last_cy = 0.0 # Control point reflected by S/T
+
+    text = d.lstrip()
+    if text and text[0] not in _COMMANDS:
+        raise ValueError(f"Path data does not start with a command: '{d[:20]}'")
+
+    for command, arguments in _COMMAND_RE.findall(text):
+        relative = command.islower()
+        command = command.upper()
+
+        if command == 'Z':
+            if arguments.strip(_SEPARATORS):
+                raise ValueError(f"Unexpected coordinates after '{command}' in path data")
+            kinds.append(CLOSE)
+            coords += (x, y, x, y, start_x, start_y, start_x, start_y)
+            x, y = start_x, start_y
+            last_kind = CLOSE
+            continue
+
+        if command == 'A':
+            # Every argument must belong to a complete arc, anything between or after them is an error
+            end = 0
+            for match in _ARC_RE.finditer(arguments):
+                if arguments[end:match.start()].strip(_SEPARATORS):
+                    break
+                end = match.end()
+                rx, ry, rotation, large_arc, sweep, ex, ey = map(float, match.groups())
+                if relative:
+                    ex, ey = x + ex, y + ey
+                arcs[len(kinds)] = (rx, ry, rotation, large_arc, sweep)
+                kinds.append(ARC)
+                coords += (x, y, x, y, ex, ey, ex, ey)
+                x, y = ex, ey
+            if not end or arguments[end:].strip(_SEPARATORS):
+                raise ValueError(f"Wrong number of arguments for '{command}' in path data")
+            last_kind = ARC
+            continue
+
+        values = list(map(float, _NUMBER_RE.findall(arguments)))
+        if command in ('H', 'V'):
+            if not values:
+                raise ValueError(f"Missing coordinates for '{command}' in path data")
+            for value in values:
+                ex, ey = x, y
+                if command == 'H':
+                    ex = x + value if relative else value
+                else:
+                    ey = y + value if relative else value
+                kinds.append(LINE)
+                coords += (x, y, x, y, ex, ey, ex, ey)
+                x, y = ex, ey
+            last_kind = LINE
+            continue
+
+        width = {'M': 2, 'L': 2, 'T': 2, 'Q': 4, 'S': 4, 'C': 6}[command]
+        if not values or len(values) % width:
+            raise ValueError(f"Wrong number of coordinates for '{command}' in path data")
+
+        for i in range(0, len(values), width):
+            # Relative coordinates are all taken from the point this segment starts at
+            group = values[i:i + width]
+            if relative:
+                group = [v + (y if j % 2 else x) for j, v in enumerate(group)]
+            ex, ey = group[-2], group[-1]
+
+            if command == 'M' and i == 0:
+                kinds.append(MOVE)
+                coords += (ex, ey, ex, ey, ex, ey, ex, ey)
+                start_x, start_y = ex, ey
+                last_kind = MOVE
+            elif command in ('M', 'L'):
+                # Extra pairs after a move are lines
+                kinds.append(LINE)
+                coords += (x, y, x, y, ex, ey, ex, ey)
+                last_kind = LINE
+            elif command == 'C':
+                kinds.append(CUBIC)
+                coords += (x, y, *group)
+                last_cx, last_cy, last_kind = group[2], group[3], CUBIC
+            elif command == 'S':
+                cx, cy = (2 * x - last_cx, 2 * y - last_cy) if last_kind == CUBIC else (x, y)
+                kinds.append(CUBIC)
+                coords += (x, y, cx, cy, *group)
+                last_cx, last_cy, last_kind = group[0], group[1], CUBIC
+            else:
+                if command == 'Q':
+                    cx, cy = group[0], group[1]
+                else:
+                    cx, cy = (2 * x - last_cx, 2 * y - last_cy) if last_kind == QUADRATIC else (x, y)
+                kinds.append(QUADRATIC)
+                coords += (x, y, cx, cy, cx, cy, ex, ey)
+                last_cx, last_cy, last_kind = cx, cy, QUADRATIC
+            x, y = ex, ey
+
+    arc_params = None
+    if arcs:
+        arc_params = np.zeros((len(kinds), 5))
+        for i, params in arcs.items():
+            arc_params[i] = params
+    return PathArrays(np.array(kinds, dtype=np.int8), np.array(coords, dtype=float).reshape(-1, 4, 2), arc_params)
@@ -0,0 +1,92 @@
+import numpy as np
+from claude import PolylineSet, as_polyline_set
+
+PREVIEW_SIZE = (8, 8) # Inches
+PREVIEW_DPI = 100
+MARKER_LIMIT = 20000 # Vertex markers are only drawn when fewer points than this are left after decimation
+
+def decimate(polylines, limits, resolution):
+    """Drop every point that lands on the same screen pixel as the point before it
+
+    limits is the (min_x, min_y, max_x, max_y) area shown over resolution (width, height) pixels. The first and last
+    point of each polyline are always kept. What is left is about one point per pixel a line passes through, however
+    densely the polylines were sampled.
+    """
+    polylines = as_polyline_set(polylines)
+    points = polylines.points
+    if not len(points):
+        return polylines
+    min_x, min_y, max_x, max_y = limits
+    cell = np.array([(max_x - min_x) or 1, (max_y - min_y) or 1]) / resolution
+    pixels = np.floor((points - (min_x, min_y)) / cell).astype(np.int64)
+
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = np.any(pixels[1:] != pixels[:-1], axis=1)
+    starts, ends = polylines.offsets[:-1], polylines.offsets[1:]
+    filled = ends > starts
+    keep[starts[filled]] = True
+    keep[ends[filled] - 1] = True
+    return polylines.select(keep)
+
+def _limits(points):
+    if not len(points):
+        return 0, 0, 1, 1
+    return (*points.min(axis=0).tolist(), *points.max(axis=0).tolist())
+
+def render(polylines, title, xlabel, ylabel, limits=None, output=None, markers=True):
+    """Draw polylines as one LineCollection (plus one marker artist), decimated to the figure's resolution
+
+    Each polyline gets the next tab10 color. With output the figure is written to that file (e.g. a PNG) through
+    matplotlib's Agg canvas, which needs no display; otherwise it is shown in a window.
+    Returns the number of points drawn.
+    """
+    from matplotlib.collections import LineCollection
+    from matplotlib import colormaps
+
+    polylines = as_polyline_set(polylines)
+    limits = limits or _limits(polylines.points)
+    resolution = np.array(PREVIEW_SIZE) * PREVIEW_DPI
+    polylines = decimate(polylines, limits, resolution)
+
+    if output is not None:
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=PREVIEW_SIZE, dpi=PREVIEW_DPI)
+        ax = fig.subplots()
+    else:
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots(figsize=PREVIEW_SIZE, dpi=PREVIEW_DPI)
+
+    palette = np.array(colormaps['tab10'].colors)
+    colors = palette[np.arange(len(polylines)) % len(palette)]
+    ax.add_collection(LineCollection(list(polylines), colors=colors, linewidths=1))
+    if markers and len(polylines.points) <= MARKER_LIMIT:
+        # Every vertex in one artist, colored like its polyline
+        owners = np.repeat(np.arange(len(polylines)), np.diff(polylines.offsets))
+        ax.scatter(polylines.points[:, 0], polylines.points[:, 1], s=9, c=colors[owners], alpha=0.5, linewidths=0)
+
+    min_x, min_y, max_x, max_y = limits
+    ax.set_xlim(min_x, max_x if max_x > min_x else min_x + 1)
+    ax.set_ylim(min_y, max_y if max_y > min_y else min_y + 1)
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.grid(True)
+    fig.tight_layout()
+
+    if output is not None:
+        fig.savefig(output)
+    else:
+        plt.show(block=True)
+    return len(polylines.points)
+
+def control_polylines(controls, blicks_per_quarter):
+    """Pitch controls (pos, pitch, relative points) as polylines in quarter notes and MIDI note IDs"""
+    arrays = []
+    for pos, pitch, points in controls:
+        relative = np.array(points, dtype=float).reshape(-1, 2)
+        arrays.append(np.column_stack([(pos + relative[:, 0]) / blicks_per_quarter, pitch + relative[:, 1]]))
+    return PolylineSet.from_arrays(arrays)
+
+def preview_controls(controls, blicks_per_quarter, output=None, title='Pitch controls'):
+    """Render the split pitch controls of a conversion, one color per control, see render()"""
+    return render(control_polylines(controls, blicks_per_quarter), title, 'X (quarter notes)', 'Y (MIDI note IDs)', output=output)
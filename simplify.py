@@ -0,0 +1,78 @@
+import heapq
+import numpy as np
+
+SIMPLIFY_MODES = ('none', 'rdp', 'visvalingam')
+
+def rdp_mask(points, tolerance):
+    """Ramer-Douglas-Peucker: mark the points to keep so no dropped point is farther than tolerance from the result"""
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        inner = points[start + 1:end] - points[start]
+        chord = points[end] - points[start]
+        chord_len = np.hypot(chord[0], chord[1])
+        if chord_len == 0:
+            dist = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            dist = np.abs(inner[:, 0] * chord[1] - inner[:, 1] * chord[0]) / chord_len
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+def _triangle_areas(a, b, c):
+    return np.abs((b[..., 0] - a[..., 0]) * (c[..., 1] - a[..., 1]) - (c[..., 0] - a[..., 0]) * (b[..., 1] - a[..., 1])) / 2
+
+def visvalingam_mask(points, tolerance):
+    """Visvalingam-Whyatt: repeatedly drop the point with the smallest effective area while it is below tolerance^2 / 2
+
+    tolerance^2 / 2 is the area of a triangle whose base and height both equal the tolerance.
+    """
+    n = len(points)
+    keep = np.ones(n, dtype=bool)
+    if n < 3:
+        return keep
+    threshold = tolerance * tolerance / 2
+
+    prev = np.arange(-1, n - 1)
+    nxt = np.arange(1, n + 1)
+    areas = np.full(n, np.inf)
+    areas[1:-1] = _triangle_areas(points[:-2], points[1:-1], points[2:])
+    heap = [(area, i) for i, area in enumerate(areas[1:-1].tolist(), start=1)]
+    heapq.heapify(heap)
+
+    while heap:
+        area, i = heapq.heappop(heap)
+        if not keep[i] or area != areas[i]:
+            continue # Stale entry, the point's area changed since it was pushed
+        if area >= threshold:
+            break
+        keep[i] = False
+        p, q = prev[i], nxt[i]
+        nxt[p] = q
+        prev[q] = p
+        # Neighbours get their area recomputed; never let it drop below the removed one so the order stays monotonic
+        for j in (p, q):
+            if 0 < j < n - 1:
+                areas[j] = max(area, float(_triangle_areas(points[prev[j]], points[j], points[nxt[j]])))
+                heapq.heappush(heap, (areas[j], j))
+    return keep
+
+def simplify_mask(points, tolerance, mode='rdp'):
+    """Mark which points of an (N, 2) polyline survive simplification with the given mode"""
+    if mode == 'none' or len(points) < 3:
+        return np.ones(len(points), dtype=bool)
+    if mode == 'rdp':
+        return rdp_mask(points, tolerance)
+    return visvalingam_mask(points, tolerance)
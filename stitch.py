@@ -0,0 +1,97 @@
+import math
+from collections import defaultdict
+import numpy as np
+
+def _step_x(points, end, step):
+    # X step from the first point that differs from points[end], walking towards that end; 0 if there is none
+    moved = np.flatnonzero(np.any(points[::step] != points[end], axis=1))
+    return points[end, 0] - points[::step][moved[0], 0] if len(moved) else 0.0
+
+def _endpoints(polylines):
+    # Endpoint 2i is the head of polyline i and 2i + 1 its tail. Each gets the X step of arriving at it,
+    # walking the polyline towards that end: >= 0 means the endpoint can end a chain, <= 0 that it can start one
+    positions = []
+    arrivals = []
+    for points in polylines:
+        positions.append(points[0])
+        positions.append(points[-1])
+        arrivals.append(_step_x(points, 0, 1))
+        arrivals.append(_step_x(points, -1, -1))
+    return np.array(positions).reshape(-1, 2), np.array(arrivals)
+
+def _candidate_pairs(positions, tolerance):
+    # Endpoint pairs of different polylines closer than tolerance, found through a uniform grid hash
+    grid = defaultdict(list)
+    cells = np.floor(positions / tolerance).astype(np.int64)
+    for i, (cx, cy) in enumerate(cells.tolist()):
+        grid[cx, cy].append(i)
+
+    pairs = []
+    for i, (cx, cy) in enumerate(cells.tolist()):
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for j in grid.get((cx + dx, cy + dy), ()):
+                    if j > i and i // 2 != j // 2:
+                        distance = math.dist(positions[i], positions[j])
+                        if distance <= tolerance:
+                            pairs.append((distance, i, j))
+    pairs.sort()
+    return pairs
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+def chain_polylines(polylines, tolerance):
+    """Join polylines whose endpoints lie within tolerance of each other into chains
+
+    Only joins where X keeps increasing across the seam are made, so split_polyline does not cut the
+    chain right there again; closest endpoints are joined first and no chain ever closes on itself.
+    Returns one list of (polyline index, reversed) per chain, in order of each chain's first polyline.
+    Polylines with fewer than two points are never joined.
+    """
+    count = len(polylines)
+    joinable = [i for i in range(count) if len(polylines[i]) >= 2]
+    if len(joinable) < 2:
+        return [[(i, False)] for i in range(count)]
+
+    positions, arrivals = _endpoints([polylines[i] for i in joinable])
+    orientation = {} # Polyline -> reversed, fixed by its first join
+    following = {}
+    preceding = {}
+    parent = list(range(count))
+
+    for _, u, v in _candidate_pairs(positions, tolerance):
+        # The chain can run through u into v, or through v into u
+        for end, start in ((u, v), (v, u)):
+            if arrivals[end] < 0 or arrivals[start] > 0:
+                continue
+            first, second = joinable[end // 2], joinable[start // 2]
+            # Ending a chain at a head means walking that polyline backwards, and so does starting at a tail
+            first_reversed, second_reversed = end % 2 == 0, start % 2 == 1
+            if first in following or orientation.get(first, first_reversed) != first_reversed:
+                continue
+            if second in preceding or orientation.get(second, second_reversed) != second_reversed:
+                continue
+            root_first, root_second = _find(parent, first), _find(parent, second)
+            if root_first == root_second:
+                continue
+            parent[root_first] = root_second
+            orientation[first], orientation[second] = first_reversed, second_reversed
+            following[first] = second
+            preceding[second] = first
+            break
+
+    chains = []
+    for i in range(count):
+        if i in preceding:
+            continue
+        chain = [(i, orientation.get(i, False))]
+        while chain[-1][0] in following:
+            j = following[chain[-1][0]]
+            chain.append((j, orientation[j]))
+        chains.append(chain)
+    chains.sort(key=lambda chain: min(i for i, _ in chain))
+    return chains
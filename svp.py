@@ -0,0 +1,82 @@
+import json
+import uuid
+from consts import make_group, make_group_ref, make_project, placeholder_note, track_name
+
+PITCH_CONTROLS_MARKER = "__pitch_controls__"
+LIBRARY_MARKER = "__library__"
+GROUP_REFS_MARKER = "__group_refs__"
+FIRST_PITCH_ID = 1000
+DEFAULT_GROUP_END = 22579200000 # 32 quarter notes in blicks
+
+def format_number(value, decimals):
+    """Format a float with at most the given number of decimals, dropping trailing zeros"""
+    text = f"{value:.{decimals}f}"
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    if text == '-0':
+        text = '0'
+    return text
+
+class SVPWriter:
+    """Streams an SVP project to a file, writing each pitch control as soon as it is produced
+
+    The project skeleton comes from consts.py; it is serialized once and split around the library and
+    group reference arrays, and every note group around its pitchControls array, so groups and controls
+    can be written in between without any buffering. Only the small group references wait for the end.
+    """
+
+    def __init__(self, f, time_decimals=0, pitch_decimals=4):
+        self.f = f
+        self.time_decimals = time_decimals
+        self.pitch_decimals = pitch_decimals
+        self.pitch_id = FIRST_PITCH_ID
+        self.pitch_controls = 0
+        self.group_refs = []
+        self.group_tail = None
+        self.group_controls = None # Pitch controls in the open group, None while no group is open
+
+        project = make_project([LIBRARY_MARKER], str(uuid.uuid4()), [GROUP_REFS_MARKER])
+        self.head, rest = json.dumps(project, ensure_ascii=False).split(json.dumps(LIBRARY_MARKER))
+        self.middle, self.tail = rest.split(json.dumps(GROUP_REFS_MARKER))
+
+    def __enter__(self):
+        self.f.write(self.head)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            if not self.group_refs:
+                self.begin_group()
+            self.end_group()
+            self.f.write(self.middle)
+            self.f.write(", ".join(json.dumps(ref, ensure_ascii=False) for ref in self.group_refs))
+            self.f.write(self.tail)
+
+    def begin_group(self, blick_begin=0, blick_end=DEFAULT_GROUP_END, name=track_name, notes=None):
+        """Close the open note group, if any, and start a new one for the pitch controls that follow"""
+        self.end_group()
+        group_uuid = str(uuid.uuid4())
+        group = make_group(name, group_uuid, [PITCH_CONTROLS_MARKER], [placeholder_note] if notes is None else notes)
+        head, self.group_tail = json.dumps(group, ensure_ascii=False).split(json.dumps(PITCH_CONTROLS_MARKER))
+        self.f.write((", " if self.group_refs else "") + head)
+        self.group_refs.append(make_group_ref(group_uuid, blick_end, blick_begin))
+        self.group_controls = 0
+
+    def end_group(self):
+        if self.group_controls is not None:
+            self.f.write(self.group_tail)
+            self.group_controls = None
+
+    def write_pitch_control(self, pos, pitch, points):
+        """Write one curve pitch control; points are flattened [x, y, ...] offsets from (pos, pitch) in blicks/semitones"""
+        if self.group_controls is None:
+            self.begin_group()
+        coords = ", ".join(format_number(v, self.pitch_decimals if i % 2 else self.time_decimals)
+                           for i, v in enumerate(points))
+        separator = "," if self.group_controls else ""
+        self.f.write(f'{separator}{{"pos": {format_number(pos, self.time_decimals)}, '
+                     f'"pitch": {format_number(pitch, self.pitch_decimals)}, "id": "{self.pitch_id}", '
+                     f'"type": "curve", "points": [{coords}]}}')
+        self.pitch_id += 1
+        self.pitch_controls += 1
+        self.group_controls += 1
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from svg.path import CubicBezier, QuadraticBezier, Arc
+from claude import adaptive_parameters, sample_segment
+
+def random_point(rng):
+    return complex(*rng.uniform(0, 100, 2))
+
+def random_segments(rng, count):
+    segments = []
+    for _ in range(count):
+        start, end = random_point(rng), random_point(rng)
+        segments.append(CubicBezier(start, random_point(rng), random_point(rng), end))
+        segments.append(QuadraticBezier(start, random_point(rng), end))
+        segments.append(Arc(start, complex(*rng.uniform(5, 80, 2)), rng.uniform(0, 360),
+                            bool(rng.integers(2)), bool(rng.integers(2)), end))
+    # Curves that double back over their own chord
+    segments.append(QuadraticBezier(0j, 100 + 0j, 50 + 0j))
+    segments.append(CubicBezier(56.26 + 60.34j, 18.39 + 19.03j, 59.45 + 64.64j, 69.02 + 72.89j))
+    return segments
+
+def worst_deviation(segment, t, samples=200):
+    # Largest distance from a dense sampling of each piece of the curve to that piece's chord segment
+    worst = 0.0
+    for t0, t1 in zip(t[:-1], t[1:]):
+        points = sample_segment(segment, np.linspace(t0, t1, samples))
+        start, chord = points[0], points[-1] - points[0]
+        length2 = chord @ chord
+        along = np.clip((points - start) @ chord / length2, 0, 1) if length2 else np.zeros(len(points))
+        offsets = points - start - along[:, None] * chord
+        worst = max(worst, np.hypot(offsets[:, 0], offsets[:, 1]).max())
+    return worst
+
+@pytest.mark.parametrize('tolerance', [1.0, 0.1, 0.01])
+def test_chords_stay_within_tolerance(tolerance):
+    for segment in random_segments(np.random.default_rng(int(1 / tolerance)), 100):
+        t = adaptive_parameters(segment, tolerance)
+        assert t[0] == 0 and t[-1] == 1 and np.all(np.diff(t) > 0)
+        assert worst_deviation(segment, t) <= tolerance * (1 + 1e-9), segment
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from svg.path import Line, CubicBezier, QuadraticBezier, Arc
+from claude import arc_lengths, arc_length_parameters, path_to_polyline, sample_segment, _speed_of, _gauss_integrate
+
+def random_point(rng):
+    return complex(*rng.uniform(-100, 100, 2))
+
+def random_segments(rng, count=40):
+    segments = []
+    for _ in range(count):
+        start, end = random_point(rng), random_point(rng)
+        segments.append(CubicBezier(start, random_point(rng), random_point(rng), end))
+        segments.append(QuadraticBezier(start, random_point(rng), end))
+        # Nearly collinear quadratics, with the control point inside, past the end and almost on the chord
+        along = rng.uniform(-0.5, 1.5)
+        segments.append(QuadraticBezier(start, start + (end - start) * along + complex(*rng.normal(0, 1e-6, 2)), end))
+        radius = complex(*rng.uniform(5, 80, 2))
+        segments.append(Arc(start, radius, rng.uniform(0, 360), bool(rng.integers(2)), bool(rng.integers(2)), end))
+        segments.append(Arc(start, complex(radius.real, radius.real), 0, bool(rng.integers(2)), bool(rng.integers(2)), end))
+        segments.append(Line(start, end))
+    return segments
+
+def dense_length(segment, panels=4096):
+    speed, params = _speed_of(segment)
+    edges = np.linspace(0, 1, panels + 1)[None]
+    return _gauss_integrate(speed, params[None], edges[:, :-1], edges[:, 1:]).sum()
+
+def piece_lengths(segment, t, samples=4000):
+    # Lengths between consecutive parameters in t, from a dense polyline of each piece
+    lengths = []
+    for t0, t1 in zip(t[:-1], t[1:]):
+        points = sample_segment(segment, np.linspace(t0, t1, samples))
+        lengths.append(np.hypot(*np.diff(points, axis=0).T).sum())
+    return np.array(lengths)
+
+def test_arc_lengths_match_svg_path():
+    segments = random_segments(np.random.default_rng(0), 15)
+    lengths, errors = arc_lengths(segments)
+    expected = np.array([segment.length(error=1e-12) for segment in segments])
+    np.testing.assert_allclose(lengths, expected, rtol=1e-10, atol=1e-10)
+    # The reported bounds hold against a much finer quadrature (svg.path itself is only good to about 1e-11),
+    # and the exact formulas report none
+    quadrature = [i for i, error in enumerate(errors) if error]
+    finer = [dense_length(segments[i]) for i in quadrature]
+    assert np.all(np.abs(lengths[quadrature] - finer) <= errors[quadrature] + 1e-13 * lengths[quadrature])
+    exact = [i for i, segment in enumerate(segments) if isinstance(segment, (Line, QuadraticBezier))]
+    assert not errors[exact].any()
+
+def test_arc_lengths_with_scale():
+    rng = np.random.default_rng(1)
+    sx, sy = 0.25, 3.0
+    stretch = lambda z: complex(z.real * sx, z.imag * sy)
+    segments = [CubicBezier(*(random_point(rng) for _ in range(4))) for _ in range(20)] + \
+               [QuadraticBezier(*(random_point(rng) for _ in range(3))) for _ in range(20)]
+    stretched = [type(segment)(*(stretch(getattr(segment, name)) for name in
+                                 (('start', 'control1', 'control2', 'end') if isinstance(segment, CubicBezier) else ('start', 'control', 'end'))))
+                 for segment in segments]
+    lengths, _ = arc_lengths(segments, scale=(sx, sy))
+    np.testing.assert_allclose(lengths, [segment.length(error=1e-12) for segment in stretched], rtol=1e-9)
+
+@pytest.mark.parametrize('segment, rtol', [
+    (CubicBezier(0j, 100 + 0j, 0 + 100j, 100 + 100j), 1e-6),
+    (CubicBezier(0j, 300 + 10j, -200 + 10j, 100 + 0j), 1e-6),
+    (Arc(0j, 80 + 20j, 30, True, False, 60 + 40j), 1e-6),
+    # Turns back on itself: the kink in its speed limits the quadrature of the piece holding the turn
+    (QuadraticBezier(0j, 200 + 0j, 50 + 0j), 1e-4),
+])
+def test_arc_length_parameters_split_evenly(segment, rtol):
+    t = arc_length_parameters(segment, 12)
+    assert t[0] == 0 and t[-1] == 1 and np.all(np.diff(t) > 0)
+    pieces = piece_lengths(segment, t)
+    np.testing.assert_allclose(pieces, segment.length(error=1e-12) / 12, rtol=rtol)
+
+def test_flatten_arclength_samples_are_evenly_spaced():
+    # Chords of many short pieces are close to their arcs, so equal arc lengths show up as equal chords
+    points = path_to_polyline('M0,0 C200,0 -100,100 100,100', 2, 'arclength')
+    chords = np.hypot(*np.diff(points, axis=0).T)[1:] # The first point is the move's, repeated by the curve
+    assert len(points) > 200
+    np.testing.assert_allclose(chords, chords.mean(), rtol=1e-3)
+    uniform = np.hypot(*np.diff(path_to_polyline('M0,0 C200,0 -100,100 100,100', 2, 'uniform'), axis=0).T)[1:]
+    assert uniform.max() / uniform.min() > 2
@@ -0,0 +1,20 @@
+import argparse
+import pytest
+from main import add_conversion_arguments
+
+def parse(argv):
+    parser = argparse.ArgumentParser(add_help=False)
+    add_conversion_arguments(parser)
+    return parser.parse_args(argv)
+
+@pytest.mark.parametrize('argv', [['--simplify-cents', '0'], ['--simplify-blicks', '-1'], ['--simplify-cents', 'nan'],
+                                  ['--stitch-cents', '0'], ['--stitch-blicks', '-3e6'],
+                                  ['--partition-by', '0'], ['--partition-by', '-1'],
+                                  ['--decimals', '-1'], ['--time-decimals', '-2'], ['--decimals', '2.5']])
+def test_invalid_values_are_rejected(argv):
+    with pytest.raises(SystemExit):
+        parse(argv)
+
+def test_valid_values_are_kept():
+    args = parse(['--simplify-cents', '0.5', '--simplify-blicks', '1e6', '--decimals', '0', '--time-decimals', '2'])
+    assert (args.simplify_cents, args.simplify_blicks, args.decimals, args.time_decimals) == (0.5, 1e6, 0, 2)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from svg.path import parse_path
+from claude import path_to_polyline
+from pathdata import parse_path_data
+
+PATHS = [
+    'M10 10 L20 20 L30 10',
+    'm10 10 l10 10 l10 -10',
+    'M10 10 20 20 30 10',                                  # Implicit lineto after M
+    'm10 10 10 10 10 -10',
+    'M0 0 H10 V10 h-5 v-5',
+    'M0,0 C10,20 30,20 40,0 S70,-20 80,0',                 # S reflects the previous control point
+    'M0,0 c10,20 30,20 40,0 s30,-20 40,0',
+    'M0 0 S10 10 20 0',                                    # S without a cubic before it
+    'M0,0 Q10,20 20,0 T40,0 T60,0',                        # T reflects the previous control point
+    'M0,0 q10,20 20,0 t20,0',
+    'M0 0 L10 0 T20 10',                                   # T without a quadratic before it
+    'M0 0 A10 5 30 1 0 20 20',
+    'M0 0 a5 5 0 0110 10',                                 # Packed arc flags
+    'M0,0 A5,5,0,0,1,10,10,5,5,0,0,1,20,20',
+    'M0 0 a5 5 0 1 1 0 0.001',
+    'M1e1 2E1 L-1.5e-1 .5 L+3 4.',                         # Exponents, signs and bare decimal points
+    'M0-1L2-3.5.5.5',                                      # Numbers without separators
+    'M0 0 L10 0 L10 10 Z L20 20',                          # Drawing on after Z starts at the subpath start
+    'M0 0 L10 0 L10 10 z m5 5 l5 0 z',
+    'M0 0 L10 0 M20 20 L30 20',
+    '  M 0 , 0 L 10 , 10  ',
+]
+
+MALFORMED = [
+    'foo',
+    'foo M0 0 L1 1',
+    ' ,M0 0 L1 1',
+    'M0 0 A 5 5 0 0 1',
+    'M0 0 A5 5 0 0 1 10 10 3',
+    'M0 0 A',
+    'M0 0 L1 1 Z 5',
+    'M0 0 H',
+]
+
+@pytest.mark.parametrize('flatten', ['uniform', 'arclength', 'adaptive'])
+@pytest.mark.parametrize('d', PATHS)
+def test_parse_path_data_matches_svg_path(d, flatten):
+    expected = path_to_polyline(parse_path(d), 0.5, flatten, 0.05)
+    actual = path_to_polyline(parse_path_data(d), 0.5, flatten, 0.05)
+    assert actual.shape == expected.shape
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-9)
+
+@pytest.mark.parametrize('d', MALFORMED)
+def test_malformed_path_data_is_rejected(d):
+    with pytest.raises(Exception):
+        parse_path(d)
+    with pytest.raises(ValueError):
+        parse_path_data(d)
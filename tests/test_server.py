@@ -0,0 +1,28 @@
+import argparse
+import os
+import pytest
+from main import ConversionServer, add_conversion_arguments
+
+SHAPES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'shapes.svg')
+
+@pytest.fixture
+def server():
+    parser = argparse.ArgumentParser(add_help=False)
+    add_conversion_arguments(parser)
+    return ConversionServer(parser.parse_args(['--no-cache']))
+
+def test_request_values_are_converted_like_the_command_line(server):
+    args = server._args({'input': SHAPES, 'width': '8', 'decimals': 3, 'clip': [0, 0, 0.5, 1], 'stitch': True})
+    assert (args.width, args.decimals, args.clip, args.stitch) == (8.0, 3, (0.0, 0.0, 0.5, 1.0), True)
+    assert server._args({'clip': '0,0,0.5,1', 'partition_by': None}).clip == (0.0, 0.0, 0.5, 1.0)
+
+@pytest.mark.parametrize('option', [{'width': 'wide'}, {'width': True}, {'width': None}, {'decimals': 2.5},
+                                    {'clip': '0,0,1'}, {'flatten': 'smooth'}, {'stitch': 'yes'}, {'cache_dir': '/tmp'}])
+def test_bad_request_values_fail_the_request(server, option):
+    response = server.handle({'id': 7, 'input': SHAPES, **option})
+    assert response['id'] == 7 and not response['ok']
+    assert next(iter(option)) in response['error']
+
+def test_request_with_string_width_converts(server):
+    response = server.handle({'input': SHAPES, 'width': '8'})
+    assert response['ok'] and response['pitch_controls'] > 0
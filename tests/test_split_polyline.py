@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from main import split_polyline, BLICK, TINY_WIGGLE, SEG_MERGE_SLOPE_TOLERANCE
+
+def reference_split(polyline, tiny_wiggle):
+    # The original closure from pitch_controls, kept verbatim apart from plotting, as the behavior to match
+    segments = []
+    ref_point = polyline[0]
+    current_segment = [ref_point]
+    maximum_wiggle = 0
+    merged_wiggle = False
+
+    def finish_current_segment(current_point):
+        nonlocal current_segment, merged_wiggle, maximum_wiggle, ref_point
+        merged_wiggle = False
+        maximum_wiggle = 0
+        ref_point = current_point
+
+        def slope(point1, point2):
+            ret = (point2[1] - point1[1]) / (point2[0] - point1[0]) if (point2[0] - point1[0]) != 0 else 1e-5
+            return ret if ret != 0 else 1e-5
+
+        finished = False
+        if len(current_segment) > 2 and len(current_segment) <= 5:
+            good_for_merge = True
+            total_slope = slope(current_segment[0], current_segment[-1])
+            for i in range(len(current_segment) - 1):
+                if abs(slope(current_segment[i], current_segment[i + 1]) / total_slope - 1) > SEG_MERGE_SLOPE_TOLERANCE:
+                    good_for_merge = False
+                    break
+            if good_for_merge and abs(current_segment[-1][0] - current_segment[0][0]) < (5 * tiny_wiggle / BLICK):
+                segments.append([current_segment[0], current_segment[-1]])
+                finished = True
+
+        if len(segments) > 0 and len(current_segment) == 2 and len(segments[-1]) == 2:
+            slope_last = slope(segments[-1][0], segments[-1][1])
+            slope_current = slope(current_segment[0], current_segment[1])
+            slope_total = slope(segments[-1][0], current_segment[1])
+            if abs(slope_last / slope_current - 1) < SEG_MERGE_SLOPE_TOLERANCE and \
+                abs(slope_total / slope_current - 1) < SEG_MERGE_SLOPE_TOLERANCE and \
+                abs(current_segment[1][0] - segments[-1][0][0]) < (3 * tiny_wiggle / BLICK):
+                segments[-1][1] = current_segment[1]
+                finished = True
+            elif abs(slope_last - slope_current) < min(0.05, SEG_MERGE_SLOPE_TOLERANCE):
+                segments[-1][1] = current_segment[1]
+                finished = True
+
+        if not finished:
+            segments.append(current_segment)
+
+        current_segment = [current_point]
+
+    for point in polyline[1:]:
+        x_wiggle = abs(point[0] - ref_point[0])
+        maximum_wiggle = max(maximum_wiggle, x_wiggle)
+        if maximum_wiggle < (tiny_wiggle / BLICK):
+            current_segment = [current_segment[0], point]
+            merged_wiggle = True
+        elif point[0] >= current_segment[-1][0]:
+            if merged_wiggle:
+                current_segment = [current_segment[0], point]
+                finish_current_segment(point)
+                current_segment = []
+            current_segment.append(point)
+        else:
+            current_segment.append(point)
+            finish_current_segment(point)
+    segments.append(current_segment)
+    return segments
+
+def random_polyline(rng):
+    # Random walks mixing steps below and above the wiggle size, with repeated points, vertical runs and turnarounds
+    count = int(rng.integers(1, 60))
+    wiggle = TINY_WIGGLE / BLICK
+    step = rng.choice([wiggle / 4, wiggle, 4 * wiggle, 0.05])
+    dx = rng.normal(rng.uniform(-1, 1) * step, step, count)
+    dx[rng.random(count) < 0.1] = 0
+    dy = rng.normal(0, step, count)
+    dy[rng.random(count) < 0.1] = 0
+    points = np.column_stack([np.cumsum(dx), np.cumsum(dy)])
+    if rng.random() < 0.2:
+        # Exactly collinear stretches exercise the merge heuristics
+        points[:, 1] = points[:, 0] * rng.uniform(-2, 2)
+    return points
+
+@pytest.mark.parametrize('seed', range(10))
+def test_split_polyline_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(500):
+        points = random_polyline(rng)
+        tiny_wiggle = TINY_WIGGLE / rng.choice([0.5, 1, 4])
+        expected = reference_split(list(points), tiny_wiggle)
+        actual = split_polyline(points, tiny_wiggle)
+        assert len(actual) == len(expected)
+        for indices, segment in zip(actual, expected):
+            np.testing.assert_array_equal(points[indices], np.array(segment))
+
+def test_split_polyline_single_point():
+    assert [list(indices) for indices in split_polyline(np.array([[0.5, 0.5]]), TINY_WIGGLE)] == [[0]]
@@ -0,0 +1,77 @@
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import pytest
+import main
+from main import add_conversion_arguments, sample_svg, prepare_polylines, control_batches, write_controls
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+# shapes.svp was written by the original string-template writer with -p 0.5; its shapes are in the order it extracted them
+SHAPES_ARGS = ['-p', '0.5']
+UUID_RE = re.compile(r'\s*[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\s*')
+# Half of the last decimal kept by the defaults --time-decimals 0 and --decimals 4
+TIME_TOLERANCE = 0.5 + 1e-6
+PITCH_TOLERANCE = 0.5e-4 + 1e-9
+
+def conversion_args(argv):
+    parser = argparse.ArgumentParser(add_help=False)
+    add_conversion_arguments(parser)
+    return parser.parse_args(['--no-cache', *argv])
+
+def convert(svg_file, argv):
+    args = conversion_args(argv)
+    polylines = prepare_polylines(sample_svg(svg_file, args).normalized_polylines, args)
+    f = io.StringIO()
+    write_controls(f, control_batches(polylines, args, args.x), args)
+    return json.loads(f.getvalue(), strict=False)
+
+def load(svp_file):
+    with open(svp_file, encoding='utf-8') as f:
+        return json.loads(f.read(), strict=False)
+
+def skeleton(project):
+    # Everything but the pitch controls, with UUIDs replaced since they are random
+    if isinstance(project, dict):
+        return {key: skeleton(value) for key, value in project.items() if key != 'pitchControls'}
+    if isinstance(project, list):
+        return [skeleton(value) for value in project]
+    if isinstance(project, str) and UUID_RE.fullmatch(project):
+        return 'uuid'
+    return project
+
+def test_project_structure_matches_baseline():
+    expected, actual = load(os.path.join(DATA, 'shapes.svp')), convert(os.path.join(DATA, 'shapes.svg'), SHAPES_ARGS)
+    assert skeleton(actual) == skeleton(expected)
+
+def test_pitch_controls_match_baseline():
+    expected, actual = load(os.path.join(DATA, 'shapes.svp')), convert(os.path.join(DATA, 'shapes.svg'), SHAPES_ARGS)
+    expected = [control for group in expected['library'] for control in group['pitchControls']]
+    actual = [control for group in actual['library'] for control in group['pitchControls']]
+    assert len(actual) == len(expected)
+    for got, want in zip(actual, expected):
+        assert (got['id'], got['type'], len(got['points'])) == (want['id'], want['type'], len(want['points']))
+        assert got['pos'] == pytest.approx(want['pos'], abs=TIME_TOLERANCE)
+        assert got['pitch'] == pytest.approx(want['pitch'], abs=PITCH_TOLERANCE)
+        assert got['points'][0::2] == pytest.approx(want['points'][0::2], abs=TIME_TOLERANCE)
+        assert got['points'][1::2] == pytest.approx(want['points'][1::2], abs=PITCH_TOLERANCE)
+
+def test_partition_groups_use_whole_blicks():
+    project = convert(os.path.join(DATA, 'shapes.svg'), ['--partition-by', '0.37'])
+    refs = [ref for track in project['tracks'] for ref in track['groups']]
+    notes = [note for group in project['library'] for note in group['notes']]
+    assert len(refs) > 1 and len(notes) == len(refs)
+    for value in [ref[key] for ref in refs for key in ('blickAbsoluteBegin', 'blickAbsoluteEnd')] + \
+                 [note[key] for note in notes for key in ('onset', 'duration')]:
+        assert isinstance(value, int)
+    assert all(a['blickAbsoluteEnd'] == b['blickAbsoluteBegin'] for a, b in zip(refs, refs[1:]))
+
+@pytest.mark.parametrize('argv', [['--partition-by', '1', '--clip', '5,5,6,6'], ['--partition-by', '1', '--stream', '--clip', '5,5,6,6']])
+def test_stats_with_nothing_drawn(argv, tmp_path, monkeypatch):
+    output = tmp_path / 'empty.svp'
+    monkeypatch.setattr(sys, 'argv', ['main.py', os.path.join(DATA, 'shapes.svg'), str(output), '--no-cache', '--stats', *argv])
+    main.main()
+    project = load(output)
+    assert not [control for group in project['library'] for control in group['pitchControls']]
@@ -0,0 +1,19 @@
+import argparse
+from main import IncrementalConverter, add_conversion_arguments
+
+def converter():
+    parser = argparse.ArgumentParser(add_help=False)
+    add_conversion_arguments(parser)
+    return IncrementalConverter(parser.parse_args([]))
+
+def test_incomplete_shapes_are_skipped_silently(tmp_path, capsys):
+    svg = tmp_path / 'drawing.svg'
+    svg.write_text('<svg xmlns="http://www.w3.org/2000/svg" width="100" height="100">'
+                   '<path/><rect width="3" height="3"/><path d="M0 0 A 5"/>'
+                   '<rect x="10" y="10" width="50" height="30"/></svg>')
+    watched = converter()
+    watched.update(str(svg))
+    assert watched.write(str(tmp_path / 'drawing.svp')) > 0
+    # Only the malformed path data is an error
+    errors = [line for line in capsys.readouterr().out.splitlines() if line.startswith('Error')]
+    assert errors == ["Error processing path #2: Wrong number of arguments for 'A' in path data"]
@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from main import batch_inputs, BLICK, TINY_WIGGLE
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PAIR_CHUNK = 1 << 22 # Sample/segment pairs looked at per vectorized step, to bound memory
+WORST_CONTROLS = 5   # Worst controls listed per file
+
+def load_controls(svp_file):
+    """Every pitch control of an SVP project as an (N, 2) array of absolute (blicks, semitones) points, in file order"""
+    with open(svp_file, encoding='utf-8') as f:
+        project = json.loads(f.read(), strict=False)
+    curves = []
+    for group in project['library']:
+        for control in group['pitchControls']:
+            points = np.array(control['points'], dtype=float).reshape(-1, 2)
+            curves.append(points + (control['pos'], control['pitch']))
+    return curves
+
+def _resample(curve, count):
+    # The curve's own points plus count points evenly spaced along its point index, so the curve need not be monotonic
+    knots = np.arange(len(curve))
+    positions = np.union1d(knots, np.linspace(0, len(curve) - 1, count))
+    return np.column_stack([np.interp(positions, knots, curve[:, 0]), np.interp(positions, knots, curve[:, 1])])
+
+def _segments(curves):
+    # Every edge of every curve as (t0, t1, p0, p1) rows with t0 <= t1, single points as zero-length edges,
+    # long edges cut into pieces no longer than a few typical ones so that lookups by time stay narrow
+    rows = []
+    for curve in curves:
+        if len(curve) == 1:
+            rows.append(np.concatenate([curve, curve], axis=1))
+        else:
+            rows.append(np.concatenate([curve[:-1], curve[1:]], axis=1))
+    rows = np.concatenate(rows)[:, [0, 2, 1, 3]] if rows else np.empty((0, 4))
+    rows[rows[:, 0] > rows[:, 1]] = rows[rows[:, 0] > rows[:, 1]][:, [1, 0, 3, 2]]
+
+    durations = rows[:, 1] - rows[:, 0]
+    limit = max(4 * np.median(durations), 1.0) if len(rows) else 1.0
+    pieces = np.maximum(np.ceil(durations / limit), 1).astype(np.int64)
+    owner = np.repeat(np.arange(len(rows)), pieces)
+    part = np.arange(len(owner)) - (np.cumsum(pieces) - pieces)[owner]
+    start, end = part / pieces[owner], (part + 1) / pieces[owner]
+    t0, t1, p0, p1 = rows[owner].T
+    rows = np.column_stack([t0 + (t1 - t0) * start, t0 + (t1 - t0) * end, p0 + (p1 - p0) * start, p0 + (p1 - p0) * end])
+    return rows[np.argsort(rows[:, 0], kind='stable')]
+
+def curve_deviations(curves, others, pitch_tolerance, time_tolerance, resample=16):
+    """How far each curve strays from the union of the others, as (pitch deviations, time deviations) per curve
+
+    Every curve is resampled (see _resample) and each sample is matched with the nearest point of the other curves,
+    measuring distances in units of the tolerances (pitch_tolerance in semitones, time_tolerance in blicks). The
+    sample's deviations are how far that point lies from it in pitch (semitones) and in time (blicks), and a curve's
+    are the largest over its samples. Only other curves within time_tolerance of a sample are searched; samples that
+    have none get the time to the nearest end of any other curve, and no pitch deviation (NaN).
+    """
+    if not curves:
+        return np.empty(0), np.empty(0)
+    samples = [_resample(curve, resample) for curve in curves]
+    sizes = [len(s) for s in samples]
+    samples = np.concatenate(samples)
+    pitch_deviation = np.full(len(samples), np.nan)
+    time_deviation = np.full(len(samples), np.inf)
+
+    segments = _segments(others)
+    if len(segments):
+        t0, t1, p0, p1 = segments.T
+        longest = (t1 - t0).max()
+        first = np.searchsorted(t0, samples[:, 0] - time_tolerance - longest, 'left')
+        last = np.searchsorted(t0, samples[:, 0] + time_tolerance, 'right')
+        counts = last - first
+        total = np.cumsum(counts)
+
+        begin = 0
+        while begin < len(samples):
+            # As many samples as fit into PAIR_CHUNK pairs, but at least one
+            done = total[begin - 1] if begin else 0
+            end = max(begin + 1, int(np.searchsorted(total, done + PAIR_CHUNK, 'right')))
+            sample = np.repeat(np.arange(begin, end), counts[begin:end])
+            segment = first[sample] + np.arange(len(sample)) - np.repeat(total[begin:end] - counts[begin:end] - done, counts[begin:end])
+            nearby = (t1[segment] >= samples[sample, 0] - time_tolerance)
+            sample, segment = sample[nearby], segment[nearby]
+
+            # Closest point of each segment, with time and pitch both scaled to their tolerance
+            t, p = samples[sample, 0], samples[sample, 1]
+            dt, dp = (t1[segment] - t0[segment]) / time_tolerance, (p1[segment] - p0[segment]) / pitch_tolerance
+            with np.errstate(divide='ignore', invalid='ignore'):
+                fraction = ((t - t0[segment]) / time_tolerance * dt + (p - p0[segment]) / pitch_tolerance * dp) / (dt ** 2 + dp ** 2)
+            fraction = np.clip(np.nan_to_num(fraction), 0, 1)
+            off_time = t0[segment] + (t1[segment] - t0[segment]) * fraction - t
+            off_pitch = p0[segment] + (p1[segment] - p0[segment]) * fraction - p
+            distance = np.hypot(off_time / time_tolerance, off_pitch / pitch_tolerance)
+
+            # Keep the nearest per sample
+            order = np.lexsort((distance, sample))
+            nearest = order[np.concatenate([[True], sample[order][1:] != sample[order][:-1]])] if len(order) else order
+            pitch_deviation[sample[nearest]] = np.abs(off_pitch[nearest])
+            time_deviation[sample[nearest]] = np.abs(off_time[nearest])
+            begin = end
+
+        # Samples without any nearby segment: distance to the closest segment end in time
+        lonely = np.flatnonzero(np.isinf(time_deviation))
+        if len(lonely):
+            ends = np.sort(segments[:, :2].ravel())
+            at = np.clip(np.searchsorted(ends, samples[lonely, 0]), 1, len(ends) - 1)
+            time_deviation[lonely] = np.minimum(np.abs(ends[at] - samples[lonely, 0]), np.abs(ends[at - 1] - samples[lonely, 0]))
+
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    return np.fmax.reduceat(pitch_deviation, starts), np.maximum.reduceat(time_deviation, starts)
+
+def compare_projects(reference_file, candidate_file, pitch_tolerance, time_tolerance, resample=16):
+    """Compare two SVP projects pitch control by pitch control, in both directions, returning a report dict
+
+    pitch_tolerance is in cents and time_tolerance in blicks. A control fails when its pitch or time deviation
+    (see curve_deviations) is over tolerance; a project passes when no control of either one fails.
+    """
+    curves = {'reference': load_controls(reference_file), 'candidate': load_controls(candidate_file)}
+    report = {side: {'controls': len(curves[side]), 'points': int(sum(len(curve) for curve in curves[side]))}
+              for side in curves}
+    failures = []
+    pitch_worst = time_worst = 0.0
+    for side, other in (('reference', 'candidate'), ('candidate', 'reference')):
+        pitch, timing = curve_deviations(curves[side], curves[other], pitch_tolerance / 100, time_tolerance, resample)
+        cents = pitch * 100
+        failed = (cents > pitch_tolerance) | (timing > time_tolerance)
+        report[side]['failed'] = int(failed.sum())
+        if len(cents):
+            pitch_worst = max(pitch_worst, float(np.nanmax(cents, initial=0)))
+            time_worst = max(time_worst, float(timing.max()))
+        # The worst controls, scored by how many tolerances away they are
+        score = np.fmax(np.nan_to_num(cents, nan=0) / pitch_tolerance, timing / time_tolerance)
+        for i in np.argsort(-score, kind='stable')[:WORST_CONTROLS].tolist():
+            if failed[i]:
+                start = curves[side][i][0]
+                failures.append({'file': side, 'control': i, 'pos': float(start[0] / BLICK), 'pitch': float(start[1]), 'cents': None if np.isnan(cents[i]) else float(cents[i]),
+                                 'blicks': float(timing[i])})
+    report.update(max_cents=pitch_worst, max_blicks=time_worst, worst=failures,
+                  ok=not report['reference']['failed'] and not report['candidate']['failed'])
+    return report
+
+def cache_options(directory):
+    """['--no-cache'] if directory/main.py has that option, so timings never come from its cache; older revisions have none"""
+    result = subprocess.run([sys.executable, os.path.join(directory, 'main.py'), '--help'], capture_output=True, text=True)
+    return ['--no-cache'] if '--no-cache' in result.stdout else []
+
+def run_converter(directory, svg_file, output_file, extra_args, repeat=1):
+    """Run directory/main.py on one SVG, returning the best wall time in seconds (None if it failed) and its output"""
+    command = [sys.executable, os.path.join(directory, 'main.py'), svg_file, output_file, '-f', *extra_args]
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = subprocess.run(command, capture_output=True, text=True)
+        seconds = time.perf_counter() - started
+        if result.returncode:
+            return None, result.stdout + result.stderr
+        best = seconds if best is None else min(best, seconds)
+    return best, result.stdout
+
+def _ratio(new, old):
+    return f"{new / old:.2f}x" if old else '-'
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert SVGs with a reference and a candidate converter and check that '
+                                     'the projects agree, pitch control by pitch control.')
+    parser.add_argument('inputs', type=str, help='Directory of SVG files, or a glob pattern such as "corpus/*.svg"')
+    parser.add_argument('--reference', type=str, default=HERE, help="Directory holding the reference main.py (default: verify.py's own)")
+    parser.add_argument('--candidate', type=str, default=HERE, help="Directory holding the candidate main.py (default: verify.py's own)")
+    parser.add_argument('--reference-args', type=str, default='', help='Extra options for the reference, e.g. "-p 2"')
+    parser.add_argument('--candidate-args', type=str, default='', help='Extra options for the candidate, e.g. "-p 2 --simplify rdp"')
+    parser.add_argument('--pitch-tolerance', type=float, default=1.0, help='Allowed pitch deviation in cents (default: 1)')
+    parser.add_argument('--time-tolerance', type=float, default=TINY_WIGGLE,
+                        help=f'Allowed time deviation in blicks (default: {TINY_WIGGLE:.0f})')
+    parser.add_argument('--resample', type=int, default=16, help='Points compared per pitch control besides its own (default: 16)')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per converter and file, the fastest is reported (default: 1)')
+    parser.add_argument('--keep', type=str, help='Keep the SVP files in this directory instead of a temporary one')
+    parser.add_argument('--json', type=str, help='Write the full report to this JSON file')
+    args = parser.parse_args()
+
+    svg_files = batch_inputs(args.inputs)
+    if not svg_files:
+        print(f"No SVG files found for '{args.inputs}'.")
+        return 1
+
+    converters = {'reference': (args.reference, cache_options(args.reference) + args.reference_args.split()),
+                  'candidate': (args.candidate, cache_options(args.candidate) + args.candidate_args.split())}
+    reports = []
+    with tempfile.TemporaryDirectory() as scratch:
+        work_dir = args.keep or scratch
+        os.makedirs(work_dir, exist_ok=True)
+        for svg_file in svg_files:
+            name = os.path.splitext(os.path.basename(svg_file))[0]
+            outputs = {side: os.path.join(work_dir, f"{name}.{side}.svp") for side in ('reference', 'candidate')}
+            seconds = {}
+            report = {'svg': svg_file}
+            for side, (directory, extra) in converters.items():
+                seconds[side], output = run_converter(directory, svg_file, outputs[side], extra, args.repeat)
+                if seconds[side] is None:
+                    report.update(ok=False, error=f"{side} failed: {output.strip()}")
+                    break
+            else:
+                report.update(compare_projects(outputs['reference'], outputs['candidate'],
+                                               args.pitch_tolerance, args.time_tolerance, args.resample))
+                report.update(reference_seconds=seconds['reference'], candidate_seconds=seconds['candidate'])
+            reports.append(report)
+
+            if 'error' in report:
+                print(f"{svg_file}: FAILED, {report['error']}")
+                continue
+            reference, candidate = report['reference'], report['candidate']
+            print(f"{svg_file}: {'ok' if report['ok'] else 'FAILED'}  "
+                  f"controls {reference['controls']} -> {candidate['controls']} ({_ratio(candidate['controls'], reference['controls'])})  "
+                  f"points {reference['points']} -> {candidate['points']} ({_ratio(candidate['points'], reference['points'])})  "
+                  f"time {report['reference_seconds']:.2f}s -> {report['candidate_seconds']:.2f}s "
+                  f"({_ratio(report['candidate_seconds'], report['reference_seconds'])})  "
+                  f"max {report['max_cents']:.3g} cents, {report['max_blicks']:.3g} blicks")
+            for worst in report['worst']:
+                cents = '-' if worst['cents'] is None else f"{worst['cents']:.3g}"
+                print(f"    {worst['file']} control #{worst['control']} at quarter {worst['pos']:.3f}, pitch {worst['pitch']:.2f}: "
+                      f"{cents} cents, {worst['blicks']:.3g} blicks")
+
+    failed = sum(not report['ok'] for report in reports)
+    print(f"{len(reports) - failed} of {len(reports)} files within {args.pitch_tolerance:g} cents and {args.time_tolerance:g} blicks")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'pitch_tolerance': args.pitch_tolerance, 'time_tolerance': args.time_tolerance, 'files': reports}, f, indent=2)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())